@@ -0,0 +1,66 @@
+"""Compare parsing a file of stored responses in parallel with parsing it serially.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_bulk [number of responses]
+"""
+import collections
+import json
+import os
+import sys
+import tempfile
+import time
+
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisBulk import iter_responses, map_chunks
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test_LuisResponse', 'Response.json')
+
+
+def top_intent(response):
+    return response.top_scoring_intent.name
+
+
+def count_intents(responses):
+    return collections.Counter(r.top_scoring_intent.name for r in responses)
+
+
+def write_payloads(path: str, count: int):
+    with open(FIXTURE, 'r') as f:
+        line = json.dumps(json.load(f)['NoMissingParameters']) + '\n'
+    with open(path, 'w') as f:
+        f.writelines(line for _ in range(count))
+
+
+def serial(path: str):
+    with open(path, 'rb') as f:
+        return collections.Counter(Response(json.loads(line)).top_scoring_intent.name for line in f if line.strip())
+
+
+def measure(path: str) -> dict:
+    """Seconds taken to count the top intents in the file with each approach"""
+    approaches = {
+        'serial': lambda: serial(path),
+        'iter_responses': lambda: collections.Counter(iter_responses(path, top_intent)),
+        'map_chunks': lambda: sum(map_chunks(path, count_intents), collections.Counter())
+    }
+    results = {}
+    for name, approach in approaches.items():
+        start = time.perf_counter()
+        approach()
+        results[name] = time.perf_counter() - start
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payloads.jsonl')
+        write_payloads(path, count)
+        print('{} responses, {:.1f} MB, {} CPUs'.format(count, os.path.getsize(path) / 1e6, os.cpu_count()))
+        for name, seconds in measure(path).items():
+            print('{:<16}{:>8.2f} s'.format(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Measure how long importing the client modules takes in a fresh interpreter.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_import
+"""
+import statistics
+import subprocess
+import sys
+
+MODULES = ['luis_wrapper.LuisResponse', 'luis_wrapper.LuisClient', 'requests']
+
+
+def import_time(module: str) -> float:
+    """Seconds it takes to import the module in a new interpreter"""
+    code = 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'.format(module)
+    return float(subprocess.check_output([sys.executable, '-c', code], universal_newlines=True))
+
+
+def measure(repeat=10) -> dict:
+    """Median import time in seconds of each module"""
+    return {module: statistics.median(import_time(module) for _ in range(repeat)) for module in MODULES}
+
+
+def main():
+    print('{:<28}{:>12}'.format('module', 'import (ms)'))
+    for module, seconds in measure().items():
+        print('{:<28}{:>12.2f}'.format(module, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
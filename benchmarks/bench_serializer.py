@@ -0,0 +1,50 @@
+"""Compare the speed and size of LuisSerializer with json and pickle.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_serializer
+"""
+import json
+import os
+import pickle
+import timeit
+
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper import LuisSerializer
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test_LuisResponse', 'Response.json')
+
+
+def load_fixture() -> dict:
+    with open(FIXTURE, 'r') as f:
+        return json.load(f)['NoMissingParameters']
+
+
+def measure(number=20000, repeat=5) -> dict:
+    """Seconds per call of the fastest repeat for loading and dumping a response, and the size in bytes"""
+    response = Response(load_fixture())
+    formats = {
+        'json': (lambda r: json.dumps(r.json).encode('utf-8'), lambda data: Response(json.loads(data))),
+        'pickle': (pickle.dumps, pickle.loads),
+        'LuisSerializer': (LuisSerializer.dumps, LuisSerializer.loads)
+    }
+    results = {}
+    for name, (dumps, loads) in formats.items():
+        data = dumps(response)
+        results[name] = {
+            'loads': min(timeit.repeat(lambda: loads(data), number=number, repeat=repeat)) / number,
+            'dumps': min(timeit.repeat(lambda: dumps(response), number=number, repeat=repeat)) / number,
+            'size': len(data)
+        }
+    return results
+
+
+def main():
+    print('{:<16}{:>12}{:>12}{:>8}'.format('format', 'loads (us)', 'dumps (us)', 'bytes'))
+    for name, result in measure().items():
+        print('{:<16}{:>12.2f}{:>12.2f}{:>8}'.format(name, result['loads'] * 1e6, result['dumps'] * 1e6,
+                                                    result['size']))
+
+
+if __name__ == '__main__':
+    main()
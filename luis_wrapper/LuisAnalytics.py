@@ -0,0 +1,274 @@
+"""Export of responses to columnar Parquet files for offline analysis.
+
+Requires pyarrow (pip install luis_wrapper[parquet]).
+Every response is split into three tables, linked by run_id and response_id:
+
+* queries: run_id, response_id, query, top_intent, top_score, intent_names, intent_scores
+* entities: run_id, response_id, type, value, start_index, end_index, score
+* dialogs: run_id, response_id, context_id, status, prompt, parameter_name, parameter_type
+
+Each table is written to its own subdirectory, so a whole table can be read as one dataset,
+e.g. pyarrow.parquet.read_table('<directory>/queries').
+Every sink (and every process using it) has its own run_id, used in the names of the files it writes,
+so sinks sharing a directory never overwrite each other's files.
+"""
+import datetime
+import logging
+import os
+import queue
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+TABLES = ('queries', 'entities', 'dialogs')
+
+_COLUMNS = {
+    'queries': ('run_id', 'response_id', 'query', 'top_intent', 'top_score', 'intent_names', 'intent_scores'),
+    'entities': ('run_id', 'response_id', 'type', 'value', 'start_index', 'end_index', 'score'),
+    'dialogs': ('run_id', 'response_id', 'context_id', 'status', 'prompt', 'parameter_name', 'parameter_type')
+}
+
+_STOP = object()
+
+
+def _schemas(pa) -> dict:
+    # Every row of a file has the same run_id, so it is dictionary encoded
+    run_id = ('run_id', pa.dictionary(pa.int32(), pa.string()))
+    response_id = ('response_id', pa.int64())
+    return {
+        'queries': pa.schema([
+            run_id, response_id, ('query', pa.string()), ('top_intent', pa.string()), ('top_score', pa.float64()),
+            ('intent_names', pa.list_(pa.string())), ('intent_scores', pa.list_(pa.float64()))]),
+        'entities': pa.schema([
+            run_id, response_id, ('type', pa.string()), ('value', pa.string()),
+            ('start_index', pa.int32()), ('end_index', pa.int32()), ('score', pa.float64())]),
+        'dialogs': pa.schema([
+            run_id, response_id, ('context_id', pa.string()), ('status', pa.string()),
+            ('prompt', pa.string()), ('parameter_name', pa.string()), ('parameter_type', pa.string())])
+    }
+
+
+class _ColumnBuffer:
+    """Buffers the rows of the three tables column wise until they are flushed.
+
+    The run_id columns are filled in when the buffer is written.
+    """
+    def __init__(self):
+        self.columns = {table: {column: [] for column in _COLUMNS[table] if column != 'run_id'} for table in TABLES}
+        self.responses = 0
+
+    def add(self, response_id: int, response):
+        queries = self.columns['queries']
+        queries['response_id'].append(response_id)
+        queries['query'].append(response.query)
+        queries['top_intent'].append(response.top_scoring_intent.name)
+        queries['top_score'].append(response.top_scoring_intent.score)
+        queries['intent_names'].append([i.name for i in response.intents])
+        queries['intent_scores'].append([i.score for i in response.intents])
+
+        entities = self.columns['entities']
+        for entity in response.entities:
+            entities['response_id'].append(response_id)
+            entities['type'].append(entity.type)
+            entities['value'].append(entity.value)
+            entities['start_index'].append(entity.start_index)
+            entities['end_index'].append(entity.end_index)
+            entities['score'].append(entity.score)
+
+        if response.dialog is not None:
+            dialogs = self.columns['dialogs']
+            dialogs['response_id'].append(response_id)
+            dialogs['context_id'].append(response.dialog.context_id)
+            dialogs['status'].append(response.dialog.status)
+            dialogs['prompt'].append(response.dialog.prompt)
+            dialogs['parameter_name'].append(response.dialog.name)
+            dialogs['parameter_type'].append(response.dialog.parameter_type)
+        self.responses += 1
+
+
+class ParquetSink:
+    """Streams responses into compressed Parquet files, one set of files per table.
+
+    Responses are buffered column wise and handed to a background thread as a row group every batch_size responses,
+    so adding a response never waits for compression or disk I/O, and the memory used is bounded.
+    Errors while writing are logged and counted instead of raised. The sink is thread safe.
+
+    Attributes
+    ----------
+    directory : str
+        Directory the files are written to
+    batch_size : int
+        Number of responses buffered before a row group is written
+    rows_per_file : int
+        Number of responses written to a file before a new file is started
+    run_id : str
+        Identifies the responses and files written by this sink in this process
+    written : int
+        Number of responses written to the files
+    dropped : int
+        Number of responses dropped because the writer could not keep up or failed
+    errors : int
+        Number of batches that could not be written
+    files : list[str]
+        The paths of the files written
+    """
+    def __init__(self, directory: str, batch_size=10000, compression='zstd', prefix='luis', rows_per_file=1000000,
+                 max_pending_batches=4):
+        """
+
+        Parameters
+        ----------
+        directory : str
+            Directory the files are written to. Created if it does not exist.
+        batch_size : int (10000)
+            Number of responses buffered before a row group is written
+        compression : str (zstd)
+            Parquet compression codec
+        prefix : str (luis)
+            The files are named <directory>/<table>/<prefix>-<run_id>-<part>.parquet
+        rows_per_file : int (1000000)
+            Number of responses written to a file before a new file is started
+        max_pending_batches : int (4)
+            Number of full batches that may wait for the writer. Further batches are dropped.
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('ParquetSink requires pyarrow. Install it with: pip install luis_wrapper[parquet]')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schemas = _schemas(pyarrow)
+        for table in TABLES:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.rows_per_file = rows_per_file
+        self.compression = compression
+        self.prefix = prefix
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.files = []
+        self._max_pending_batches = max_pending_batches
+        self._lock = threading.Lock()
+        self._start_run()
+
+    def add(self, response):
+        """Add a response. A full batch is handed to the writer thread without waiting for it to be written."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked after the sink was created: the writer thread and open files belong to the parent
+                self._start_run()
+            self._buffer.add(self._next_id, response)
+            self._next_id += 1
+            if self._buffer.responses < self.batch_size:
+                return
+            buffer, self._buffer = self._buffer, _ColumnBuffer()
+            self._submit(buffer)
+
+    def flush(self):
+        """Write the buffered responses and wait until everything added so far is written"""
+        with self._lock:
+            buffer, self._buffer = self._buffer, _ColumnBuffer()
+            pending = self._start_writer() if buffer.responses else self._pending
+        if buffer.responses:
+            # Waits for room in the queue outside the lock, since the writer thread takes the lock too
+            pending.put(buffer)
+        pending.join()
+
+    def close(self):
+        """Write the buffered responses and close the files"""
+        self.flush()
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._pending.put(_STOP)
+            thread.join()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        # Responses added after closing go to new files instead of overwriting the closed ones
+        self._part += 1
+        self._part_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, table: str, part: int) -> str:
+        """Path of a part of the table written by this sink"""
+        return os.path.join(self.directory, table, '{}-{}-{:05d}.parquet'.format(self.prefix, self.run_id, part))
+
+    def _start_run(self):
+        """Start a new run with its own id, writer thread and files. Must hold the lock."""
+        self._pid = os.getpid()
+        self.run_id = '{}-{}-{}'.format(
+            datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S'), self._pid, uuid.uuid4().hex[:8])
+        self._next_id = 0
+        self._buffer = _ColumnBuffer()
+        self._pending = queue.Queue(self._max_pending_batches)
+        self._thread = None
+        self._writers = {}
+        self._part = 0
+        self._part_rows = 0
+
+    def _start_writer(self) -> queue.Queue:
+        """Start the writer thread if it is not running and return its queue. Must hold the lock."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_batches, name='luis-parquet-sink', daemon=True)
+            self._thread.start()
+        return self._pending
+
+    def _submit(self, buffer: _ColumnBuffer):
+        """Hand a full buffer to the writer thread, dropping it if the writer is behind. Must hold the lock."""
+        try:
+            self._start_writer().put_nowait(buffer)
+        except queue.Full:
+            self.dropped += buffer.responses
+            logger.warning('Parquet writer is behind, dropped {} responses'.format(buffer.responses))
+
+    def _write_batches(self):
+        pending = self._pending
+        while True:
+            buffer = pending.get()
+            try:
+                if buffer is _STOP:
+                    return
+                self._write(buffer)
+            except Exception:
+                logger.exception('Failed writing {} responses to {}'.format(buffer.responses, self.directory))
+                with self._lock:
+                    self.errors += 1
+                    self.dropped += buffer.responses
+            finally:
+                pending.task_done()
+
+    def _write(self, buffer: _ColumnBuffer):
+        """Write a buffer as a row group, starting a new part when the current one is full. Writer thread only."""
+        if self._part_rows and self._part_rows + buffer.responses > self.rows_per_file:
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+            self._part += 1
+            self._part_rows = 0
+        for table in TABLES:
+            columns = buffer.columns[table]
+            if not columns['response_id']:
+                continue
+            writer = self._writers.get(table)
+            if writer is None:
+                path = self.path(table, self._part)
+                writer = self._writers[table] = self._pq.ParquetWriter(
+                    path, self._schemas[table], compression=self.compression)
+                self.files.append(path)
+            columns = dict(columns, run_id=[self.run_id] * len(columns['response_id']))
+            writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schemas[table]))
+        self._part_rows += buffer.responses
+        with self._lock:
+            self.written += buffer.responses
+        logger.debug('Wrote {} responses to {}'.format(buffer.responses, self.directory))
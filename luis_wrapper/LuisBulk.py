@@ -0,0 +1,127 @@
+"""Parallel parsing of files with stored LUIS responses.
+
+The files are expected to contain one raw json response per line.
+The file is split into chunks at line boundaries and each chunk is parsed in a separate process.
+Only the chunk offsets are sent to the worker processes, which memory map the file themselves.
+Parsed Responses are never sent back to the parent process: pickling them costs more than parsing the json again,
+so only the results of a transform or a summarizer are returned.
+Run python -m benchmarks.bench_bulk to compare with parsing the file serially.
+"""
+import collections
+import concurrent.futures
+import gc
+import json
+import mmap
+import os
+
+from luis_wrapper.LuisResponse import Response
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def map_chunks(path: str, func, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None):
+    """Parse a file of stored responses in parallel and apply func to the responses in each chunk.
+
+    Use this to aggregate summaries in the worker processes, so only the summaries are sent back.
+
+    Parameters
+    ----------
+    path : str
+        Path to a file with one json response per line
+    func : callable
+        Called in a worker process with the list of Responses in a chunk.
+        Must be picklable, e.g. a module level function.
+    workers : int (None)
+        Number of worker processes. Defaults to the number of CPUs.
+    chunk_size : int (16 MB)
+        Approximate number of bytes in each chunk
+    max_pending : int (None)
+        Maximum number of chunks being parsed or waiting to be consumed.
+        Bounds the memory used. Defaults to twice the number of workers.
+
+    Yields
+    ------
+    object
+        The result of func for each chunk, in file order
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        for start, end in _chunk_boundaries(path, chunk_size):
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(_parse_chunk, path, start, end, func))
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_responses(path: str, transform, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_pending=None):
+    """Parse a file of stored responses in parallel and yield a small projection of each response.
+
+    The transform should return much less than the Response, e.g. the query and the top intent.
+    Use map_chunks to aggregate the responses instead, or parse the file serially if the Responses are needed.
+
+    Parameters
+    ----------
+    path : str
+        Path to a file with one json response per line
+    transform : callable
+        Called in a worker process with each Response. Its result is yielded instead of the Response.
+        Must be picklable, e.g. a module level function.
+    workers, chunk_size, max_pending
+        See map_chunks
+
+    Yields
+    ------
+    object
+        The transformed responses in file order
+    """
+    if not callable(transform):
+        raise TypeError('transform must be a callable returning a projection of a Response, '
+                        'use map_chunks to aggregate the responses instead')
+    for results in map_chunks(path, _Transformer(transform), workers, chunk_size, max_pending):
+        yield from results
+
+
+class _Transformer:
+    """Picklable function applying a transform to each response in a chunk"""
+    def __init__(self, transform):
+        self.transform = transform
+
+    def __call__(self, responses: list) -> list:
+        return [self.transform(r) for r in responses]
+
+
+def _chunk_boundaries(path: str, chunk_size: int):
+    """Yield (start, end) offsets of chunks ending at line boundaries"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    newline = mm.find(b'\n', end - 1)
+                    end = size if newline == -1 else newline + 1
+                yield start, end
+                start = end
+
+
+def _parse_chunk(path: str, start: int, end: int, func):
+    """Parse the responses between start and end in a worker process"""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = mm[start:end].splitlines()
+    # The parsed responses contain no reference cycles, but creating this many objects triggers the cyclic
+    # garbage collector over and over, which takes longer than the parsing itself
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        responses = [Response(json.loads(line)) for line in lines if line.strip()]
+        return func(responses)
+    finally:
+        if enabled:
+            gc.enable()
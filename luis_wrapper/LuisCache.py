@@ -0,0 +1,364 @@
+"""Caches for responses to new queries.
+
+A cache maps a key (built by the Client from the app id and the cleaned query) to a Response.
+Every cache implements ``get(key)``, returning a Response or None, and ``set(key, response)``.
+Responses are stored in the compact format from LuisSerializer.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+from luis_wrapper import LuisSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_key(key: bytes) -> int:
+    """Hash that is stable across processes, unlike the builtin hash"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _loads(key: str, value):
+    """Deserialize a cached value. Values that cannot be read, e.g. from an older format, are treated as missing."""
+    try:
+        return LuisSerializer.loads(value)
+    except LuisSerializer.SerializationError as err:
+        logger.warning('Ignoring unreadable cache entry for {}: {}'.format(key, err))
+        return None
+
+
+class SharedMemoryCache:
+    """A cache in a memory mapped file, shared by all processes on a host.
+
+    The file holds a hash table of fixed-size slots grouped into sets.
+    A key can only be stored in the set given by its hash. When the set is full the least recently used slot in it
+    is overwritten. Entries that do not fit in a slot are not cached.
+    Access is serialized with a lock on the file, so no server process is needed.
+
+    Attributes
+    ----------
+    path : str
+        Path of the file backing the cache. Use a path on a memory backed file system, e.g. /dev/shm.
+    hits : int
+        Number of lookups in this process that found an entry
+    misses : int
+        Number of lookups in this process that found nothing
+    """
+    _MAGIC = b'LUISSHM1'
+    _HEADER = struct.Struct('<8sIIIQ')  # magic, slots, slot size, ways, clock
+    _SLOT_HEADER = struct.Struct('<QQII')  # key hash, last used, key length, value length
+    _CLOCK_OFFSET = 20
+
+    def __init__(self, path: str, slots=4096, slot_size=4096, ways=8):
+        """
+
+        Parameters
+        ----------
+        path : str
+            Path of the file backing the cache. Created if it does not exist.
+            A ValueError is raised if the file was created with different dimensions, since other processes may
+            still have it mapped. Use a new path when changing the dimensions.
+        slots : int (4096)
+            Total number of slots. Must be a multiple of ways.
+        slot_size : int (4096)
+            Number of bytes in each slot, including a 24 byte slot header and the key
+        ways : int (8)
+            Number of slots in each set
+        """
+        import fcntl
+        if slots <= 0 or ways <= 0 or slots % ways != 0:
+            raise ValueError('slots must be a positive multiple of ways')
+        if slot_size <= self._SLOT_HEADER.size:
+            raise ValueError('slot_size must be larger than {}'.format(self._SLOT_HEADER.size))
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.hits = 0
+        self.misses = 0
+        self._size = self._HEADER.size + slots * slot_size
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._locked():
+                self._initialize()
+                self._mm = mmap.mmap(self._fd, self._size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def get(self, key: str):
+        """Get the response stored for the key, or None"""
+        key_bytes = key.encode('utf-8')
+        key_hash = _hash_key(key_bytes)
+        with self._locked():
+            offset = self._find(key_hash, key_bytes)
+            if offset is None:
+                value = None
+            else:
+                _, _, key_length, value_length = self._SLOT_HEADER.unpack_from(self._mm, offset)
+                start = offset + self._SLOT_HEADER.size + key_length
+                value = self._mm[start:start + value_length]
+                self._touch(offset)
+        response = _loads(key, value) if value is not None else None
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    def set(self, key: str, response):
+        """Store the response for the key"""
+        key_bytes = key.encode('utf-8')
+        value = LuisSerializer.dumps(response)
+        if self._SLOT_HEADER.size + len(key_bytes) + len(value) > self.slot_size:
+            logger.debug('Response for {} is too large to be cached'.format(key))
+            return
+        key_hash = _hash_key(key_bytes)
+        with self._locked():
+            offset = self._find(key_hash, key_bytes)
+            if offset is None:
+                offset = self._victim(key_hash)
+            start = offset + self._SLOT_HEADER.size
+            self._mm[start:start + len(key_bytes)] = key_bytes
+            self._mm[start + len(key_bytes):start + len(key_bytes) + len(value)] = value
+            self._SLOT_HEADER.pack_into(self._mm, offset, key_hash, self._tick(), len(key_bytes), len(value))
+
+    def clear(self):
+        """Remove all entries"""
+        with self._locked():
+            self._mm[self._HEADER.size:] = bytes(self.slots * self.slot_size)
+
+    def close(self):
+        """Unmap the file. The entries stay available to other processes."""
+        self._mm.close()
+        os.close(self._fd)
+
+    def _initialize(self):
+        """Create the file if it is empty, or check that it has the expected layout. Must hold the lock.
+
+        An existing file is never resized, since shrinking a file other processes have mapped crashes them.
+        """
+        file_size = os.fstat(self._fd).st_size
+        if file_size > 0:
+            header = os.pread(self._fd, self._HEADER.size, 0)
+            if len(header) == self._HEADER.size:
+                magic, slots, slot_size, ways, _ = self._HEADER.unpack(header)
+                if magic == self._MAGIC:
+                    if (slots, slot_size, ways) != (self.slots, self.slot_size, self.ways):
+                        raise ValueError(
+                            '{} is a cache with {} slots of {} bytes in sets of {}, not {} slots of {} bytes in sets '
+                            'of {}. Use another path for a cache with new dimensions.'.format(
+                                self.path, slots, slot_size, ways, self.slots, self.slot_size, self.ways))
+                    if file_size == self._size:
+                        return
+            raise ValueError('{} exists and is not a shared memory cache'.format(self.path))
+        logger.debug('Initializing shared memory cache in {}'.format(self.path))
+        os.ftruncate(self._fd, self._size)
+        os.pwrite(self._fd, self._HEADER.pack(self._MAGIC, self.slots, self.slot_size, self.ways, 0), 0)
+
+    def _locked(self):
+        return _FileLock(self._thread_lock, self._fd, self._fcntl)
+
+    def _set_offsets(self, key_hash: int):
+        first = (key_hash % (self.slots // self.ways)) * self.ways
+        return [self._HEADER.size + (first + i) * self.slot_size for i in range(self.ways)]
+
+    def _find(self, key_hash: int, key_bytes: bytes):
+        for offset in self._set_offsets(key_hash):
+            slot_hash, _, key_length, _ = self._SLOT_HEADER.unpack_from(self._mm, offset)
+            if slot_hash == key_hash and key_length == len(key_bytes):
+                start = offset + self._SLOT_HEADER.size
+                if self._mm[start:start + key_length] == key_bytes:
+                    return offset
+        return None
+
+    def _victim(self, key_hash: int) -> int:
+        """Find an empty slot, or else the least recently used slot, in the set for the hash"""
+        victim = None
+        oldest = None
+        for offset in self._set_offsets(key_hash):
+            _, last_used, key_length, _ = self._SLOT_HEADER.unpack_from(self._mm, offset)
+            if key_length == 0:
+                return offset
+            if oldest is None or last_used < oldest:
+                victim, oldest = offset, last_used
+        return victim
+
+    def _touch(self, offset: int):
+        slot_hash, _, key_length, value_length = self._SLOT_HEADER.unpack_from(self._mm, offset)
+        self._SLOT_HEADER.pack_into(self._mm, offset, slot_hash, self._tick(), key_length, value_length)
+
+    def _tick(self) -> int:
+        clock, = struct.unpack_from('<Q', self._mm, self._CLOCK_OFFSET)
+        clock += 1
+        struct.pack_into('<Q', self._mm, self._CLOCK_OFFSET, clock)
+        return clock
+
+
+class _FileLock:
+    """Exclusive lock across threads (threading lock) and processes (lock on the file)"""
+    def __init__(self, thread_lock, fd: int, fcntl):
+        self._thread_lock = thread_lock
+        self._fd = fd
+        self._fcntl = fcntl
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc_info):
+        try:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+
+class SQLiteCache:
+    """A persistent cache in an SQLite database, surviving restarts of the process.
+
+    Every entry is stored with the version of the LUIS app that produced it. Opening the cache with a new app version
+    removes all entries from other versions, so retraining the model flushes the stale answers.
+    The most used entries can be preloaded into memory when a process starts.
+
+    Attributes
+    ----------
+    path : str
+        Path of the database file
+    app_version : str
+        Version of the LUIS app the cached responses belong to
+    ttl : float
+        Default number of seconds entries are kept. None keeps entries until the app version changes.
+    hits : int
+        Number of lookups that found an entry
+    misses : int
+        Number of lookups that found nothing
+    """
+    _HIT_FLUSH_THRESHOLD = 100
+
+    def __init__(self, path: str, app_version: str, ttl=None, preload=0, clock=time.time):
+        """
+
+        Parameters
+        ----------
+        path : str
+            Path of the database file. Created if it does not exist.
+        app_version : str
+            Version of the LUIS app the cached responses belong to
+        ttl : float (None)
+            Default number of seconds entries are kept. None keeps entries until the app version changes.
+        preload : int (0)
+            Number of the most used entries to load into memory
+        clock : callable (time.time)
+            Function returning the current time in seconds since the epoch
+        """
+        self.path = path
+        self.app_version = app_version
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._pending_hits = {}
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, app_version TEXT NOT NULL, value BLOB NOT NULL, '
+                'expires_at REAL, hits INTEGER NOT NULL DEFAULT 0)')
+            deleted = self._connection.execute(
+                'DELETE FROM entries WHERE app_version != ? OR expires_at <= ?', (app_version, clock())).rowcount
+        if deleted:
+            logger.debug('Removed {} stale entries from {}'.format(deleted, path))
+        if preload:
+            self.preload(preload)
+
+    def get(self, key: str):
+        """Get the response stored for the key, or None"""
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                entry = self._connection.execute(
+                    'SELECT value, expires_at FROM entries WHERE key = ? AND app_version = ?',
+                    (key, self.app_version)).fetchone()
+            if entry is not None and entry[1] is not None and entry[1] <= now:
+                self._memory.pop(key, None)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            if len(self._pending_hits) >= self._HIT_FLUSH_THRESHOLD:
+                self._flush_hits()
+        return _loads(key, entry[0])
+
+    def set(self, key: str, response, ttl=None):
+        """Store the response for the key.
+
+        Parameters
+        ----------
+        key : str
+            The key
+        response : Response
+            The response to store
+        ttl : float (None)
+            Number of seconds to keep the entry. Uses the default ttl of the cache if None.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        value = LuisSerializer.dumps(response)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO entries (key, app_version, value, expires_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'app_version = excluded.app_version, value = excluded.value, expires_at = excluded.expires_at',
+                (key, self.app_version, value, expires_at))
+            if key in self._memory:
+                self._memory[key] = (value, expires_at)
+
+    def preload(self, count: int):
+        """Load the count most used entries into memory"""
+        with self._lock:
+            self._flush_hits()
+            rows = self._connection.execute(
+                'SELECT key, value, expires_at FROM entries WHERE app_version = ? '
+                'AND (expires_at IS NULL OR expires_at > ?) ORDER BY hits DESC LIMIT ?',
+                (self.app_version, self._clock(), count)).fetchall()
+            for key, value, expires_at in rows:
+                self._memory[key] = (value, expires_at)
+        logger.debug('Preloaded {} entries from {}'.format(len(rows), self.path))
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries')
+            self._memory.clear()
+            self._pending_hits.clear()
+
+    def close(self):
+        """Save the hit counts and close the database"""
+        with self._lock:
+            self._flush_hits()
+            self._connection.close()
+
+    def _flush_hits(self):
+        """Write the buffered hit counts to the database. Must hold the lock."""
+        if not self._pending_hits:
+            return
+        with self._connection:
+            self._connection.executemany('UPDATE entries SET hits = hits + ? WHERE key = ?',
+                                         [(hits, key) for key, hits in self._pending_hits.items()])
+        self._pending_hits.clear()
@@ -1,14 +1,20 @@
-import requests
-from luis_wrapper import config
 from luis_wrapper.LuisResponse import Response
-import urllib
+from luis_wrapper.LuisTransport import RequestsTransport
+from luis_wrapper.LuisConcurrency import PRIORITY_INTERACTIVE
+from luis_wrapper.LuisDeadline import Deadline, DeadlineExceeded
+import contextlib
+import threading
+import urllib.parse
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class Conversation:
-    """A wrapper class around one conversation with LUIS"""
+    """A wrapper class around one conversation with LUIS
+
+    Set the deadline attribute to a Deadline to limit the total time spent on replies in the conversation.
+    """
     @property
     def last_response(self) -> Response:
         return self.responses[-1]
@@ -16,6 +22,7 @@ class Conversation:
     def __init__(self, initial_response: Response):
         logger.debug('Initializing Conversation')
         self.responses = []
+        self.deadline = None
         self.add_response(initial_response)
         logger.debug('number of responses after adding response: {}'.format(len(self.responses)))
         try:
@@ -52,7 +59,9 @@ class Client:
     _reply_url_map = '&contextid={}'  # There is also a forceset parameter used when replying, but it doesn't seem
                                       # to be used Set it with &forceset={}
 
-    def __init__(self, app_id, subscription_key):
+    def __init__(self, app_id, subscription_key, pre_classifier=None, transport=None, cache=None,
+                 limiter=None, scheduler=None, shadow=None, default_deadline=None,
+                 sink=None):
         """
 
         Parameters
@@ -61,6 +70,25 @@ class Client:
             ID of the LUIS app
         subscription_key: str (GUID without dashes)
             Subscription key for the LUIS app
+        pre_classifier: PreClassifier (None)
+            Local index used to answer trivial queries without asking LUIS.
+            Only new queries are answered locally, replies in a conversation are always sent to LUIS.
+        transport: Transport (None)
+            Transport used to send requests to LUIS. Uses a RequestsTransport if None.
+        cache: cache from LuisCache (None)
+            Cache for the responses to new queries.
+            Responses that are part of a dialog are not cached, since their context id belongs to one conversation.
+        limiter: AdaptiveLimiter (None)
+            Limits the number of requests sent to LUIS at the same time. No limit is used if None.
+        scheduler: PriorityScheduler (None)
+            Decides which requests are sent first when many are waiting, based on the priority given to analyze.
+        shadow: ShadowTraffic (None)
+            Mirrors a sample of the new queries to a candidate app, without delaying them.
+            Queries answered by the pre-classifier or the cache are sampled too.
+        default_deadline: float (None)
+            Number of seconds each call to analyze may take when no deadline is given. None allows any time.
+        sink: ParquetSink (None)
+            Receives every response returned by LUIS, e.g. to export them for analysis.
         """
         if not app_id or app_id.strip() == '':
             raise ValueError('App id cannot be empty or None')
@@ -68,8 +96,18 @@ class Client:
             raise ValueError('Subscription key cannot be empty or None')
         self.app_id = app_id
         self.subscription_key = subscription_key
+        self.pre_classifier = pre_classifier
+        self.transport = transport if transport is not None else RequestsTransport()
+        self.cache = cache
+        self.limiter = limiter
+        self.scheduler = scheduler
+        self.shadow = shadow
+        self.default_deadline = default_deadline
+        self.sink = sink
+        self.deadline_misses = 0
+        self._metrics_lock = threading.Lock()
 
-    def analyze(self, text, conversation=None) -> Conversation:
+    def analyze(self, text, conversation=None, priority=PRIORITY_INTERACTIVE, deadline=None) -> Conversation:
         """Send the text to LUIS to be analyzed.
 
         Request an analysis of the given text from LUIS. If a conversation is given, the text is treated as an
@@ -84,39 +122,120 @@ class Client:
             Cannot be None or only spaces
         conversation : Conversation (None)
             The conversation this request is part of
+        priority : str (interactive)
+            Priority class of the request, used by the scheduler.
+            Tag background jobs with 'bulk' so they do not slow down requests from live users.
+        deadline : float or Deadline (None)
+            Time budget for the request, covering waiting for a slot, connecting, reading and parsing the response.
+            A number is taken as seconds from now. Uses the default deadline of the client if None.
+            When replying, the deadline of the conversation also applies.
 
         Returns
         -------
         Conversation
             The conversation that result from this request to LUIS
+
+        Raises
+        ------
+        DeadlineExceeded
+            If the deadline expired before the response was ready
         """
         clean_text = self._clean_text(text)
         if not clean_text:
             raise ValueError("Text cannot be empty")
+        if deadline is None and self.default_deadline is not None:
+            deadline = self.default_deadline
+        if deadline is not None and not isinstance(deadline, Deadline):
+            deadline = Deadline(deadline)
         if conversation:
-            reply = self._reply(clean_text, conversation)
-        else:
-            reply = self._ask(clean_text)
+            deadline = Deadline.earliest(deadline, conversation.deadline)
+        try:
+            if conversation:
+                reply = self._reply(clean_text, conversation, priority, deadline)
+            else:
+                reply = self._ask(clean_text, priority, deadline)
+        except TimeoutError as err:
+            if deadline is None or not deadline.expired():
+                raise
+            with self._metrics_lock:
+                self.deadline_misses += 1
+            if isinstance(err, DeadlineExceeded):
+                raise
+            raise DeadlineExceeded('Deadline exceeded waiting for LUIS') from err
         return reply
 
-    def _ask(self, text: str) -> Conversation:
+    def _ask(self, text: str, priority=PRIORITY_INTERACTIVE, deadline=None) -> Conversation:
         """Send new query to LUIS"""
-        url = self._build_base_url(text)
-        response = self._get_response(url)
+        response = self._answer(text, priority, deadline)
+        # Sampled whichever way the query was answered, so the candidate also sees the most frequent queries
+        if self.shadow is not None:
+            self.shadow.submit(text, response)
         return Conversation(response)
 
-    def _reply(self, text: str, conversation: Conversation) -> Conversation:
+    def _answer(self, text: str, priority=PRIORITY_INTERACTIVE, deadline=None) -> Response:
+        """Answer a new query from the pre-classifier, the cache or LUIS"""
+        if self.pre_classifier is not None:
+            response = self.pre_classifier.classify(text)
+            if response is not None:
+                return response
+        if self.cache is not None:
+            try:
+                response = self.cache.get(self._build_cache_key(text))
+            except Exception:
+                # A broken cache must never fail the request, LUIS is asked instead
+                logger.exception('Failed reading the response from the cache')
+                response = None
+            if response is not None:
+                return response
+        url = self._build_base_url(text)
+        response = self._get_response(url, priority, deadline)
+        if self.cache is not None and response.dialog is None:
+            try:
+                self.cache.set(self._build_cache_key(text), response)
+            except Exception:
+                logger.exception('Failed storing the response in the cache')
+        return response
+
+    def _reply(self, text: str, conversation: Conversation, priority=PRIORITY_INTERACTIVE,
+               deadline=None) -> Conversation:
         """Send QUery to LUIS continuing an ongoing conversation"""
         url = self._build_reply_url(text, conversation.id)
-        response = self._get_response(url)
+        response = self._get_response(url, priority, deadline)
         conversation.add_response(response)
         return conversation
 
-    def _get_response(self, url: str) -> Response:
+    def _get_response(self, url: str, priority=PRIORITY_INTERACTIVE, deadline=None) -> Response:
         """Connect to LUIS and parse response"""
-        r = requests.get(url)
-        r.raise_for_status()
-        return Response(r.json())
+        def remaining():
+            return deadline.remaining() if deadline is not None else None
+
+        if deadline is not None:
+            deadline.check('before sending the request')
+        with contextlib.ExitStack() as stack:
+            if self.scheduler is not None:
+                stack.enter_context(self.scheduler.request(priority, remaining()))
+            if self.limiter is not None:
+                stack.enter_context(self.limiter.request(remaining()))
+            # Waiting for a slot can use up the deadline, and the transports refuse a timeout of zero
+            if deadline is not None:
+                deadline.check('while waiting for a slot')
+            try:
+                body = self.transport.get(url, remaining())
+            except TimeoutError as err:
+                # A timeout cut short by the caller's budget says nothing about the load on LUIS
+                if deadline is not None and deadline.expired() and not isinstance(err, DeadlineExceeded):
+                    raise DeadlineExceeded('Deadline exceeded waiting for LUIS') from err
+                raise
+        if deadline is not None:
+            deadline.check('while reading the response')
+        response = Response(body)
+        if self.sink is not None:
+            try:
+                self.sink.add(response)
+            except Exception:
+                # Exporting responses must never fail the request
+                logger.exception('Failed adding response to the sink')
+        return response
 
     def _clean_text(self, text: str) -> str:
         """Clean text so it can be sent to LUIS"""
@@ -128,6 +247,10 @@ class Client:
         """Build the base url used when sending queries to LUIS"""
         return self._base_url_map.format(self.app_id, self.subscription_key, text)
 
+    def _build_cache_key(self, text: str):
+        """Build the key used when caching the response to a new query"""
+        return '{}/{}'.format(self.app_id, text)
+
     def _build_reply_url(self, text: str, conversation_id: str):
         """Build url used for sending queries to LUIS that responds to an earlier response from LUIS"""
         base_url = self._build_base_url(text)
@@ -135,6 +258,7 @@ class Client:
         return '{}{}'.format(base_url, reply_url)
 
 if __name__ == '__main__':
+    from luis_wrapper import config
     logging.basicConfig(level=logging.DEBUG)
     client = Client(config.APP_ID, config.SUBSCRIPTION_KEY)
     while True:
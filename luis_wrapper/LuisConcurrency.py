@@ -0,0 +1,343 @@
+"""Control of the number of requests sent to LUIS at the same time."""
+import contextlib
+import heapq
+import logging
+import threading
+import time
+
+from luis_wrapper.LuisDeadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+def is_overload_error(err: Exception) -> bool:
+    """Check if an exception raised by a transport means that LUIS is overloaded.
+
+    Rate limiting (429), server errors (5xx) and timeouts are treated as overload.
+    A DeadlineExceeded is not, since it means the caller's own time budget ran out.
+    """
+    if isinstance(err, DeadlineExceeded):
+        return False
+    if isinstance(err, TimeoutError):
+        return True
+    status_code = getattr(err, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(err, 'response', None), 'status_code', None)
+    if status_code is None:
+        return False
+    return status_code == 429 or status_code >= 500
+
+
+class AdaptiveLimiter:
+    """Limits the number of requests in flight, adapting the limit to how LUIS responds.
+
+    The limit grows additively while requests succeed and shrinks multiplicatively when LUIS is overloaded
+    (429, 5xx or timeouts) or the latency grows too much. Requests over the limit wait in a queue.
+
+    Latency is judged per window: the average latency of the successful requests in a window is compared with a
+    baseline, which follows the lowest window averages and slowly rises when latency stays high.
+    Only one decrease is made for the requests that were already in flight when the limit was last decreased,
+    so a burst of concurrent errors shrinks the limit once.
+
+    Attributes
+    ----------
+    min_limit : int
+        The limit never gets lower than this
+    max_limit : int
+        The limit never gets higher than this
+    backoff : float
+        The limit is multiplied with this when LUIS is overloaded
+    latency_tolerance : float
+        The limit is decreased when the average latency in a window is more than this times the baseline latency.
+        None disables latency based decreases.
+    window : float
+        Number of seconds in each latency window
+    in_flight : int
+        Number of requests currently sent to LUIS
+    queue_depth : int
+        Number of requests waiting for the limit
+    overloads : int
+        Number of requests that found LUIS overloaded
+    """
+    _BASELINE_DRIFT = 0.1  # Fraction of the way the baseline moves towards a higher window average
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, backoff=0.5, latency_tolerance=2.0, window=1.0,
+                 clock=time.perf_counter):
+        """
+
+        Parameters
+        ----------
+        initial_limit : int (4)
+            The limit to start from
+        min_limit : int (1)
+            The limit never gets lower than this
+        max_limit : int (64)
+            The limit never gets higher than this
+        backoff : float (0.5)
+            The limit is multiplied with this when LUIS is overloaded
+        latency_tolerance : float (2.0)
+            The limit is decreased when the average latency in a window is more than this times the baseline latency.
+            None disables latency based decreases.
+        window : float (1.0)
+            Number of seconds in each latency window
+        clock : callable (time.perf_counter)
+            Function returning the current time in seconds
+        """
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError('Limits must satisfy 1 <= min_limit <= initial_limit <= max_limit')
+        if not 0 < backoff < 1:
+            raise ValueError('backoff must be between 0 and 1')
+        if window <= 0:
+            raise ValueError('window must be positive')
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.window = window
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.overloads = 0
+        self._limit = float(initial_limit)
+        self._clock = clock
+        self._baseline = None
+        self._window_start = clock()
+        self._window_total = 0.0
+        self._window_count = 0
+        self._last_decrease = None
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """The current number of requests allowed in flight"""
+        return int(self._limit)
+
+    def metrics(self) -> dict:
+        """Current limit, requests in flight, requests waiting and overloads seen"""
+        with self._condition:
+            return {'limit': self.limit, 'in_flight': self.in_flight, 'queue_depth': self.queue_depth,
+                    'overloads': self.overloads}
+
+    def acquire(self, timeout=None) -> bool:
+        """Wait until another request may be sent.
+
+        Parameters
+        ----------
+        timeout : float (None)
+            Maximum number of seconds to wait. None waits forever.
+
+        Returns
+        -------
+        bool
+            True if the request may be sent, False if the timeout expired
+        """
+        with self._condition:
+            self.queue_depth += 1
+            try:
+                if not self._condition.wait_for(lambda: self.in_flight < self.limit, timeout):
+                    return False
+            finally:
+                self.queue_depth -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, overloaded=False):
+        """Report that a request has finished and adapt the limit.
+
+        Parameters
+        ----------
+        latency : float
+            Number of seconds the request took.
+            None if the request failed for a reason that says nothing about the load, e.g. a 404.
+            The limit is then left unchanged.
+        overloaded : bool (False)
+            True if LUIS was overloaded
+        """
+        with self._condition:
+            saturated = self.in_flight >= self.limit
+            self.in_flight -= 1
+            if latency is not None:
+                now = self._clock()
+                started = now - latency
+                if overloaded:
+                    self.overloads += 1
+                    self._decrease(started, now)
+                else:
+                    self._window_total += latency
+                    self._window_count += 1
+                    if saturated:
+                        # Only grow when the limit is actually what holds requests back
+                        self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                if now - self._window_start >= self.window:
+                    self._end_window(now)
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def request(self, timeout=None):
+        """Context manager wrapping one request to LUIS.
+
+        Waits for the limit, then measures the request and classifies any exception raised in it.
+        Raises a TimeoutError if the limit is not available within the timeout.
+        """
+        if not self.acquire(timeout):
+            raise TimeoutError('Timed out waiting for the concurrency limit')
+        start = self._clock()
+        try:
+            yield
+        except Exception as err:
+            if is_overload_error(err):
+                self.release(self._clock() - start, overloaded=True)
+            else:
+                self.release(None)
+            raise
+        self.release(self._clock() - start)
+
+    def _end_window(self, now: float):
+        """Compare the average latency of the window with the baseline and start a new window. Must hold the lock."""
+        if self._window_count:
+            average = self._window_total / self._window_count
+            if self._baseline is None or average < self._baseline:
+                self._baseline = average
+            else:
+                if self.latency_tolerance is not None and average > self._baseline * self.latency_tolerance:
+                    self._decrease(self._window_start, now)
+                self._baseline += (average - self._baseline) * self._BASELINE_DRIFT
+        self._window_start = now
+        self._window_total = 0.0
+        self._window_count = 0
+
+    def _decrease(self, started: float, now: float):
+        """Decrease the limit, unless it was already decreased after the signal started. Must hold the lock."""
+        if self._last_decrease is not None and started < self._last_decrease:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+        if self.limit != old_limit:
+            logger.debug('Decreased concurrency limit from {} to {}'.format(old_limit, self.limit))
+
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BULK = 'bulk'
+
+
+class _Waiter:
+    """A request waiting in the PriorityScheduler"""
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+
+
+class PriorityScheduler:
+    """Shares a fixed number of request slots between priority classes using weighted fair queuing.
+
+    Each class gets slots in proportion to its weight while requests of several classes are waiting, so interactive
+    requests are not starved by bulk jobs, and bulk jobs still make progress while interactive traffic is high.
+
+    Attributes
+    ----------
+    weights : dict
+        The weight of each priority class
+    in_flight : int
+        Number of requests currently holding a slot
+    """
+    def __init__(self, capacity=8, weights=None):
+        """
+
+        Parameters
+        ----------
+        capacity : int or AdaptiveLimiter (8)
+            Number of requests allowed in flight. Give an AdaptiveLimiter to follow its current limit.
+        weights : dict (None)
+            The weight of each priority class. Defaults to 8 for interactive and 1 for bulk requests.
+        """
+        self.weights = weights if weights is not None else {PRIORITY_INTERACTIVE: 8, PRIORITY_BULK: 1}
+        if not self.weights or any(w <= 0 for w in self.weights.values()):
+            raise ValueError('Weights must be positive')
+        self.in_flight = 0
+        self._capacity = capacity
+        self._virtual_time = 0.0
+        self._last_finish = {p: 0.0 for p in self.weights}
+        self._queue = []
+        self._sequence = 0
+        self._queued = {p: 0 for p in self.weights}
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        """The current number of requests allowed in flight"""
+        capacity = getattr(self._capacity, 'limit', self._capacity)
+        return max(1, int(capacity))
+
+    def metrics(self) -> dict:
+        """Requests in flight and the number of requests waiting in each priority class"""
+        with self._condition:
+            return {'capacity': self.capacity, 'in_flight': self.in_flight, 'queue_depth': dict(self._queued)}
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None) -> bool:
+        """Wait for a slot.
+
+        Parameters
+        ----------
+        priority : str (interactive)
+            The priority class of the request
+        timeout : float (None)
+            Maximum number of seconds to wait. None waits forever.
+
+        Returns
+        -------
+        bool
+            True if a slot was granted, False if the timeout expired
+        """
+        try:
+            weight = self.weights[priority]
+        except KeyError:
+            raise ValueError('Unknown priority {}. Known priorities are {}'.format(priority, list(self.weights)))
+        waiter = _Waiter(priority)
+        with self._condition:
+            start = max(self._virtual_time, self._last_finish[priority])
+            finish = start + 1 / weight
+            self._last_finish[priority] = finish
+            self._sequence += 1
+            heapq.heappush(self._queue, (finish, self._sequence, start, waiter))
+            self._queued[priority] += 1
+            self._dispatch()
+            if not self._condition.wait_for(lambda: waiter.granted, timeout):
+                waiter.cancelled = True
+                self._queued[priority] -= 1
+                return False
+            return True
+
+    def release(self):
+        """Give back a slot"""
+        with self._condition:
+            self.in_flight -= 1
+            self._dispatch()
+
+    @contextlib.contextmanager
+    def request(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """Context manager holding a slot while one request is sent.
+
+        Raises a TimeoutError if no slot is available within the timeout.
+        """
+        if not self.acquire(priority, timeout):
+            raise TimeoutError('Timed out waiting for a {} slot'.format(priority))
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _dispatch(self):
+        """Grant slots to the waiting requests with the earliest finish tags. Must hold the lock."""
+        granted = False
+        while self._queue and self.in_flight < self.capacity:
+            _, _, start, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            waiter.granted = True
+            self._queued[waiter.priority] -= 1
+            self._virtual_time = max(self._virtual_time, start)
+            self.in_flight += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
@@ -0,0 +1,41 @@
+"""Time budgets for requests to LUIS."""
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the time budget of a request or conversation is used up"""
+    pass
+
+
+class Deadline:
+    """A point in time by which work has to be finished"""
+    def __init__(self, seconds: float, clock=time.monotonic):
+        """
+
+        Parameters
+        ----------
+        seconds : float
+            Number of seconds from now until the deadline
+        clock : callable (time.monotonic)
+            Function returning the current time in seconds
+        """
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        """Number of seconds left until the deadline. Never negative."""
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self._clock() >= self.expires_at
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the deadline has expired"""
+        if self.expired():
+            raise DeadlineExceeded('Deadline exceeded {}'.format(stage))
+
+    @staticmethod
+    def earliest(*deadlines):
+        """The earliest of the given deadlines, ignoring None. None if no deadlines are given."""
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines, key=lambda d: d.expires_at) if deadlines else None
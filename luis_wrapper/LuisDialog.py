@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    """An ongoing conversation and the time it was last used"""
+    def __init__(self, conversation, last_activity: float):
+        self.conversation = conversation
+        self.last_activity = last_activity
+        self.lock = asyncio.Lock()
+
+
+class DialogDriver:
+    """Drives many concurrent multi-turn conversations with LUIS from one event loop.
+
+    Every user (or chat, or session) is identified by a key. The first text received for a key starts a new
+    conversation, later texts are sent as replies until LUIS reports that the conversation is finished.
+    The blocking calls to the client are run in an executor, so a single worker can serve many dialogs at once.
+
+    Attributes
+    ----------
+    client : Client
+        The client used to communicate with LUIS
+    conversations : dict
+        The unfinished conversations, by key
+    """
+    def __init__(self, client, on_prompt=None, on_finished=None, timeout=None, max_idle=300.0, executor=None,
+                 clock=time.monotonic):
+        """
+
+        Parameters
+        ----------
+        client : Client
+            The client used to communicate with LUIS
+        on_prompt : callable (None)
+            Called with (key, prompt, conversation) when LUIS needs more information.
+            May be a coroutine function.
+        on_finished : callable (None)
+            Called with (key, conversation) when a conversation is finished.
+            May be a coroutine function.
+        timeout : float (None)
+            Maximum number of seconds to wait for LUIS on each turn. It is given to the client as the deadline.
+            None waits forever.
+        max_idle : float (300.0)
+            Number of seconds a conversation may be idle before its context id is considered stale.
+            The next text received for a stale conversation starts a new conversation. None never expires.
+        executor : concurrent.futures.Executor (None)
+            Executor running the calls to the client. The default executor of the event loop is used if None.
+        clock : callable (time.monotonic)
+            Function returning the current time in seconds
+        """
+        self.client = client
+        self.on_prompt = on_prompt
+        self.on_finished = on_finished
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.conversations = {}
+        self._sessions = {}
+        self._executor = executor
+        self._clock = clock
+
+    async def handle(self, key, text: str):
+        """Send text from the user identified by key to LUIS.
+
+        Turns for the same key are handled one at a time, turns for different keys run concurrently.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the user the text came from
+        text : str
+            The text to be analyzed
+
+        Returns
+        -------
+        Conversation
+            The conversation the text was part of
+
+        Raises
+        ------
+        asyncio.TimeoutError or DeadlineExceeded
+            If LUIS did not answer within the timeout.
+            The conversation is dropped when this or any other exception is raised by the client.
+        """
+        session = self._get_session(key)
+        async with session.lock:
+            try:
+                conversation = await self._analyze(key, text, session.conversation)
+            except BaseException:
+                self._drop(key, session)
+                raise
+            session.last_activity = self._clock()
+            if conversation.conversation_is_finished():
+                session.conversation = None
+                self._drop(key, session)
+                await self._notify(self.on_finished, key, conversation)
+            else:
+                session.conversation = conversation
+                self._sessions[key] = session
+                self.conversations[key] = conversation
+                await self._notify(self.on_prompt, key, conversation.last_response.dialog.prompt, conversation)
+        return conversation
+
+    def expire_stale(self) -> list:
+        """Drop all conversations that have been idle for longer than max_idle.
+
+        Returns
+        -------
+        list
+            The keys of the dropped conversations
+        """
+        if self.max_idle is None:
+            return []
+        now = self._clock()
+        expired = [key for key, session in self._sessions.items()
+                   if not session.lock.locked() and now - session.last_activity > self.max_idle]
+        for key in expired:
+            self._drop(key, self._sessions[key])
+        if expired:
+            logger.debug('Expired {} stale conversations'.format(len(expired)))
+        return expired
+
+    def _get_session(self, key) -> _Session:
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = _Session(None, self._clock())
+        elif (self.max_idle is not None and not session.lock.locked()
+              and self._clock() - session.last_activity > self.max_idle):
+            logger.debug('Conversation for {} is stale, starting a new one'.format(key))
+            session.conversation = None
+            self.conversations.pop(key, None)
+        return session
+
+    def _drop(self, key, session: _Session):
+        if session is not None and self._sessions.get(key) is session:
+            del self._sessions[key]
+        self.conversations.pop(key, None)
+
+    async def _analyze(self, key, text: str, conversation):
+        loop = asyncio.get_running_loop()
+        # The deadline stops the blocking call itself, so a hanging LUIS does not tie up executor threads.
+        # wait_for is only a backstop, since it cannot stop the thread.
+        analyze = functools.partial(self.client.analyze, text, conversation, deadline=self.timeout)
+        future = loop.run_in_executor(self._executor, analyze)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Timed out waiting for LUIS, dropping conversation for {}'.format(key))
+            raise
+
+    @staticmethod
+    async def _notify(callback, *args):
+        if callback is None:
+            return
+        result = callback(*args)
+        if inspect.isawaitable(result):
+            await result
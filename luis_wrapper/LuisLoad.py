@@ -0,0 +1,279 @@
+"""Open-loop load generator for the Client.
+
+Utterances from a corpus are started at a fixed arrival rate, whether or not earlier requests have finished.
+Latency is measured from the time a request was scheduled to start, not from when a worker picked it up,
+so queueing delay in the client is included (correcting for coordinated omission).
+
+A corpus item is either a single utterance or a list of utterances. For a list, the first utterance starts a
+conversation and the following ones are sent as replies for as long as LUIS asks for more information.
+
+Run as a script to replay a corpus file, either against LUIS or against a local stub::
+
+    python -m luis_wrapper.LuisLoad corpus.txt --qps 50 --duration 30 --stub-latency-ms 80
+
+Each line in the corpus file is an item. Turns of a multi-turn item are separated by ' || '.
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import math
+import random
+import threading
+import time
+
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisTransport import StubTransport
+
+
+class LatencyHistogram:
+    """A histogram with log-linear buckets, in the style of HdrHistogram.
+
+    Values are recorded with a fixed number of significant decimal digits, so percentiles are accurate to
+    that precision regardless of the range of the values, using little memory.
+    """
+    def __init__(self, significant_digits=2, unit=1e-6):
+        """
+
+        Parameters
+        ----------
+        significant_digits : int (2)
+            Number of significant decimal digits kept for each value
+        unit : float (1e-6)
+            Smallest value distinguished, in seconds
+        """
+        self.unit = unit
+        self._sub_buckets = 2 ** math.ceil(math.log2(2 * 10 ** significant_digits))
+        self._half = self._sub_buckets // 2
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds: float):
+        """Record a value in seconds"""
+        value = max(0, int(seconds / self.unit))
+        with self._lock:
+            self._counts[self._index(value)] += 1
+            self.count += 1
+            self.total += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """The value in seconds below which the given percentage of the values fall"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(percent / 100 * self.count))
+            seen = 0
+            for index in sorted(self._counts):
+                seen += self._counts[index]
+                if seen >= rank:
+                    return min(self._upper_value(index) * self.unit, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def _index(self, value: int) -> int:
+        """Bucket index: values below sub_buckets map directly, above that each power of 2 gets half the buckets"""
+        if value < self._sub_buckets:
+            return value
+        shift = value.bit_length() - (self._sub_buckets.bit_length() - 1)
+        return self._sub_buckets + (shift - 1) * self._half + (value >> shift) - self._half
+
+    def _upper_value(self, index: int) -> int:
+        """Largest value that falls in the bucket"""
+        if index < self._sub_buckets:
+            return index
+        shift, sub_bucket = divmod(index - self._sub_buckets, self._half)
+        shift += 1
+        return ((sub_bucket + self._half + 1) << shift) - 1
+
+
+class LatencyStub:
+    """Body function for a StubTransport that answers after a random delay.
+
+    New queries get the given body. Replies get the same body with a finished dialog,
+    and new queries get a question dialog when ask_questions is set, so multi-turn items can be replayed.
+    """
+    def __init__(self, body=None, latency=lambda: 0.0, ask_questions=False):
+        """
+
+        Parameters
+        ----------
+        body : dict (None)
+            The json body to return. A minimal response is used if None.
+        latency : callable
+            Function returning the delay of each request in seconds, e.g. lambda: random.expovariate(1 / 0.08)
+        ask_questions : bool (False)
+            If True new queries get a dialog asking for more information
+        """
+        self.body = body or {
+            'query': 'query',
+            'topScoringIntent': {'intent': 'None', 'score': 1.0},
+            'intents': [{'intent': 'None', 'score': 1.0}],
+            'entities': []
+        }
+        self.latency = latency
+        self.ask_questions = ask_questions
+
+    def __call__(self, url: str) -> dict:
+        time.sleep(self.latency())
+        if '&contextid=' in url:
+            return dict(self.body, dialog={'contextId': 'stub', 'status': 'Finished'})
+        if self.ask_questions:
+            return dict(self.body, dialog={'contextId': 'stub', 'status': 'Question', 'prompt': 'More?',
+                                           'parameterName': 'Stub', 'parameterType': 'Stub'})
+        return self.body
+
+
+class LoadGenerator:
+    """Replays a corpus against a Client at a fixed arrival rate
+
+    Attributes
+    ----------
+    latency : LatencyHistogram
+        Time from the scheduled start of each item until all its turns were answered
+    service_time : LatencyHistogram
+        Time each single request to LUIS took, without queueing
+    errors : collections.Counter
+        Number of failed items by exception type
+    """
+    def __init__(self, client, corpus, qps: float, workers=64, poisson=False, clock=time.perf_counter):
+        """
+
+        Parameters
+        ----------
+        client : Client
+            The client under test
+        corpus : list
+            The items to replay, cycled if more requests than items are sent.
+            An item is an utterance or a list of utterances for a multi-turn conversation.
+        qps : float
+            Number of items started per second
+        workers : int (64)
+            Number of threads sending requests. Items wait in a queue when all are busy.
+        poisson : bool (False)
+            If True, arrivals are random with exponentially distributed gaps instead of evenly spaced
+        clock : callable (time.perf_counter)
+            Function returning the current time in seconds
+        """
+        if not corpus:
+            raise ValueError('The corpus cannot be empty')
+        if qps <= 0:
+            raise ValueError('qps must be positive')
+        self.client = client
+        self.corpus = corpus
+        self.qps = qps
+        self.workers = workers
+        self.poisson = poisson
+        self.latency = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.errors = collections.Counter()
+        self.turns = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def run(self, requests: int) -> dict:
+        """Send the given number of items and return the report"""
+        interval = 1 / self.qps
+        cpu_start = time.process_time()
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            start = self._clock()
+            intended = start
+            for i in range(requests):
+                delay = intended - self._clock()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._run_item, self.corpus[i % len(self.corpus)], intended)
+                intended += random.expovariate(self.qps) if self.poisson else interval
+        elapsed = self._clock() - start
+        return self.report(elapsed, time.process_time() - cpu_start)
+
+    def report(self, elapsed: float, cpu_time: float) -> dict:
+        """Summary of a run"""
+        completed = self.latency.count
+        failed = sum(self.errors.values())
+        items = completed + failed
+        report = {
+            'target_qps': self.qps,
+            'achieved_qps': items / elapsed if elapsed else 0.0,
+            'items': items,
+            'turns': self.turns,
+            'error_rate': failed / items if items else 0.0,
+            'errors': dict(self.errors),
+            'cpu_ms_per_turn': 1000 * cpu_time / self.turns if self.turns else 0.0,
+            'latency_ms': self._percentiles(self.latency),
+            'service_time_ms': self._percentiles(self.service_time)
+        }
+        return report
+
+    def _run_item(self, item, intended: float):
+        utterances = [item] if isinstance(item, str) else item
+        try:
+            conversation = None
+            for utterance in utterances:
+                turn_start = self._clock()
+                conversation = self.client.analyze(utterance, conversation)
+                self.service_time.record(self._clock() - turn_start)
+                with self._lock:
+                    self.turns += 1
+                if conversation.conversation_is_finished():
+                    break
+        except Exception as err:
+            with self._lock:
+                self.errors[type(err).__name__] += 1
+            return
+        self.latency.record(self._clock() - intended)
+
+    @staticmethod
+    def _percentiles(histogram: LatencyHistogram) -> dict:
+        result = {'p{}'.format(p).replace('.', '_'): 1000 * histogram.percentile(p) for p in (50, 90, 99, 99.9)}
+        result['max'] = 1000 * (histogram.max or 0.0)
+        result['mean'] = 1000 * histogram.mean
+        return result
+
+
+def read_corpus(path: str) -> list:
+    """Read a corpus file with one item per line and turns separated by ' || '"""
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            turns = [t.strip() for t in line.split('||')]
+            corpus.append(turns[0] if len(turns) == 1 else turns)
+    return corpus
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Open-loop load generator for the LUIS client')
+    parser.add_argument('corpus', help='File with one utterance per line, turns separated by " || "')
+    parser.add_argument('--qps', type=float, default=10, help='Items started per second')
+    parser.add_argument('--duration', type=float, default=10, help='Number of seconds to send items')
+    parser.add_argument('--workers', type=int, default=64, help='Number of sending threads')
+    parser.add_argument('--poisson', action='store_true', help='Use random arrivals instead of evenly spaced')
+    parser.add_argument('--app-id', help='LUIS app id. A local stub is used if not given.')
+    parser.add_argument('--subscription-key', help='LUIS subscription key')
+    parser.add_argument('--stub-latency-ms', type=float, default=50, help='Mean latency of the stub')
+    options = parser.parse_args(args)
+
+    if options.app_id:
+        client = Client(options.app_id, options.subscription_key)
+    else:
+        mean = options.stub_latency_ms / 1000
+        stub = LatencyStub(latency=lambda: random.expovariate(1 / mean) if mean else 0.0, ask_questions=True)
+        client = Client('stub', 'stub', transport=StubTransport(stub))
+    generator = LoadGenerator(client, read_corpus(options.corpus), options.qps, options.workers, options.poisson)
+    report = generator.run(int(options.qps * options.duration))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
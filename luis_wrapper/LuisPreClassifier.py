@@ -0,0 +1,215 @@
+import collections
+import copy
+import logging
+import re
+import urllib.parse
+
+from luis_wrapper.LuisResponse import Response
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """Normalize text so trivially different utterances map to the same key.
+
+    Url quoting is removed, the text is lower cased and everything but the words is dropped.
+    """
+    text = urllib.parse.unquote_plus(text)
+    return ' '.join(_WORD_PATTERN.findall(text.lower()))
+
+
+class _Entry:
+    """All the answers seen for one normalized utterance"""
+    def __init__(self):
+        self.votes = collections.Counter()
+        self.examples = {}
+        self.min_scores = {}
+
+    def add(self, intent_name: str, example: dict):
+        self.votes[intent_name] += 1
+        self.examples.setdefault(intent_name, example)
+        score = example['topScoringIntent']['score']
+        self.min_scores[intent_name] = min(score, self.min_scores.get(intent_name, score))
+
+
+class PreClassifier:
+    """A local exact-match index used to answer trivial queries without asking LUIS.
+
+    The index is built from recorded responses or from a file of labeled utterances.
+    A query is only answered locally if enough answers have been seen for it, they agree on the intent
+    and LUIS was confident about each of them.
+    Recorded answers with entities are only used for the exact query they were recorded for.
+    Queries without any words, e.g. '?', are never answered locally.
+
+    Attributes
+    ----------
+    min_count : int
+        The number of times an utterance must have been seen before it is answered locally
+    min_agreement : float
+        The fraction of the recorded answers that must agree on the top scoring intent
+    min_score : float
+        The lowest score of the top scoring intent in the recorded answers must be at least this
+    hits : int
+        Number of queries answered locally
+    misses : int
+        Number of queries that had to be sent to LUIS
+    """
+    def __init__(self, min_count=1, min_agreement=1.0, min_score=0.5):
+        """
+
+        Parameters
+        ----------
+        min_count : int (1)
+            The number of times an utterance must have been seen before it is answered locally
+        min_agreement : float (1.0)
+            The fraction of the recorded answers that must agree on the top scoring intent
+        min_score : float (0.5)
+            The lowest score of the top scoring intent in the recorded answers must be at least this.
+            Labeled utterances have a score of 1.0.
+        """
+        self.min_count = min_count
+        self.min_agreement = min_agreement
+        self.min_score = min_score
+        self.hits = 0
+        self.misses = 0
+        self._index = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the classified queries that were answered locally"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def add_response(self, response: Response):
+        """Add a response received from LUIS to the index.
+
+        Responses that are part of a dialog are ignored since their answer depends on the conversation.
+        """
+        if response.dialog is not None:
+            return
+        entry = self._entry(response.query)
+        if entry is not None:
+            entry.add(response.top_scoring_intent.name, response.json)
+
+    def add_utterance(self, intent_name: str, utterance: str):
+        """Add an utterance labeled with its intent to the index"""
+        example = {
+            'query': utterance,
+            'topScoringIntent': {'intent': intent_name, 'score': 1.0},
+            'intents': [{'intent': intent_name, 'score': 1.0}],
+            'entities': []
+        }
+        entry = self._entry(utterance)
+        if entry is not None:
+            entry.add(intent_name, example)
+
+    def load_utterances(self, path: str):
+        """Add the labeled utterances in a file to the index.
+
+        Each line contains an intent name and an utterance separated by a tab.
+        Empty lines and lines starting with # are ignored.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    intent_name, utterance = line.split('\t', 1)
+                except ValueError:
+                    raise ValueError('Line {} in {} is not of the form <intent>\\t<utterance>'.format(
+                        line_number, path))
+                self.add_utterance(intent_name.strip(), utterance.strip())
+
+    def classify(self, text: str):
+        """Answer the query locally if the index is confident about it.
+
+        Parameters
+        ----------
+        text : str
+            The query. May be url quoted.
+
+        Returns
+        -------
+        Response
+            A synthetic response for the query, or None if the query has to be sent to LUIS
+        """
+        response = self._predict(text)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def evaluate(self, responses) -> dict:
+        """Measure how often the index answers the given responses, and how often it agrees with LUIS.
+
+        The hit and miss counters are not changed.
+
+        Parameters
+        ----------
+        responses : iterable of Response
+            Responses received from LUIS, preferably ones not used to build the index
+
+        Returns
+        -------
+        dict
+            total: The number of responses evaluated
+            hits: The number of responses that would have been answered locally
+            agreements: The number of local answers with the same top scoring intent as LUIS
+            hit_rate: hits / total
+            agreement: agreements / hits
+        """
+        total = hits = agreements = 0
+        for response in responses:
+            total += 1
+            prediction = self._predict(response.query)
+            if prediction is None:
+                continue
+            hits += 1
+            if prediction.top_scoring_intent.name == response.top_scoring_intent.name:
+                agreements += 1
+        return {
+            'total': total,
+            'hits': hits,
+            'agreements': agreements,
+            'hit_rate': hits / total if total else 0.0,
+            'agreement': agreements / hits if hits else 0.0
+        }
+
+    def _entry(self, text: str):
+        """The entry for the text, created if needed. None if the text has no words."""
+        key = normalize(text)
+        if not key:
+            return None
+        try:
+            return self._index[key]
+        except KeyError:
+            entry = self._index[key] = _Entry()
+            return entry
+
+    def _predict(self, text: str):
+        key = normalize(text)
+        entry = self._index.get(key) if key else None
+        if entry is None:
+            return None
+        count = sum(entry.votes.values())
+        intent_name, votes = entry.votes.most_common(1)[0]
+        if count < self.min_count or votes / count < self.min_agreement:
+            return None
+        if entry.min_scores[intent_name] < self.min_score:
+            return None
+        example = entry.examples[intent_name]
+        query = urllib.parse.unquote_plus(text)
+        if example['entities'] and query != example['query']:
+            # The entity indexes point into the recorded query, which normalizing may have changed
+            return None
+        json = copy.deepcopy(example)
+        json['query'] = query
+        logger.debug('Answering "{}" locally with intent {}'.format(json['query'], intent_name))
+        return Response(json)
@@ -1,3 +1,8 @@
+import collections
+import datetime
+import functools
+import re
+
 
 
 class Response:
@@ -54,6 +59,8 @@ class Intent:
 
     Attributes
     ----------
+    json: dict
+        The original json of the intent.
     name : str
         Name of the intent
     score : double
@@ -76,6 +83,7 @@ class Intent:
             Dictionary containing the values needed for initializing the Parameter.
             The values has to be immediately accessible from the dictionary.
         """
+        self.json = intent
         self.name = intent['intent']
         self.score = intent['score']
         try:
@@ -92,18 +100,149 @@ class Intent:
         return self.actions[0]
 
 
+_TIMEX_DATE = re.compile(r'^(\d{4}|XXXX)-(\d{2}|XX)-(\d{2}|XX)$')
+_TIMEX_WEEK = re.compile(r'^(\d{4}|XXXX)-W(\d{2}|XX)(?:-(\d))?$')
+_TIMEX_TIME = re.compile(r'^(\d{2})(?::(\d{2}))?(?::(\d{2}))?$')
+_TIMEX_DURATION = re.compile(r'^P(?:(\d+(?:\.\d+)?)Y)?(?:(\d+(?:\.\d+)?)M)?'
+                             r'(?:(\d+(?:\.\d+)?)W)?(?:(\d+(?:\.\d+)?)D)?'
+                             r'(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+# Valid ranges of the date and time parts, by field
+_TIMEX_RANGES = {'month': (1, 12), 'day': (1, 31), 'week': (1, 53), 'weekday': (1, 7),
+                 'hour': (0, 23), 'minute': (0, 59), 'second': (0, 59)}
+
+
+class Timex(collections.namedtuple('Timex', [
+        'value', 'year', 'month', 'day', 'week', 'weekday', 'hour', 'minute', 'second', 'duration',
+        'duration_years', 'duration_months'])):
+    """A decoded TIMEX expression as used in LUIS datetime resolutions, e.g. XXXX-WXX-1 or 2016-12-24T09:30.
+
+    Parts that are not specified (written with X), not present or out of range are None.
+    weekday is 1 for Monday through 7 for Sunday.
+    duration is a datetime.timedelta with the weeks, days, hours, minutes and seconds of a duration.
+    Years and months have no fixed length, so they are kept as numbers in duration_years and duration_months,
+    e.g. P1Y6M2D has duration_years 1, duration_months 6 and a duration of 2 days.
+    Instances are immutable and shared between entities with the same expression.
+    """
+    __slots__ = ()
+
+    @property
+    def date(self):
+        """The datetime.date if year, month and day are all specified, else None"""
+        if None in (self.year, self.month, self.day):
+            return None
+        try:
+            return datetime.date(self.year, self.month, self.day)
+        except ValueError:  # A day that does not exist in the month, e.g. 2016-02-30
+            return None
+
+    @property
+    def time(self):
+        """The datetime.time if the hour is specified, else None"""
+        if self.hour is None:
+            return None
+        return datetime.time(self.hour, self.minute or 0, self.second or 0)
+
+
+def _known(part):
+    return None if part is None or 'X' in part else int(part)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_timex(value: str) -> Timex:
+    """Decode a TIMEX expression. Results are cached, so repeated expressions are only parsed once."""
+    parts = dict.fromkeys(Timex._fields)
+    parts['value'] = value
+    duration = _TIMEX_DURATION.match(value)
+    if duration and value != 'P' and value != 'PT':
+        years, months = (parse_number(p) if p else None for p in duration.groups()[:2])
+        weeks, days, hours, minutes, seconds = (float(p) if p else 0 for p in duration.groups()[2:])
+        parts['duration'] = datetime.timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes,
+                                               seconds=seconds)
+        parts['duration_years'], parts['duration_months'] = years, months
+        return Timex(**parts)
+    date_part, _, time_part = value.partition('T')
+    date = _TIMEX_DATE.match(date_part)
+    week = _TIMEX_WEEK.match(date_part)
+    if date:
+        parts['year'], parts['month'], parts['day'] = (_known(p) for p in date.groups())
+    elif week:
+        parts['year'], parts['week'], parts['weekday'] = (_known(p) for p in week.groups())
+    time = _TIMEX_TIME.match(time_part)
+    if time:
+        parts['hour'], parts['minute'], parts['second'] = (_known(p) for p in time.groups())
+    for field, (low, high) in _TIMEX_RANGES.items():
+        if parts[field] is not None and not low <= parts[field] <= high:
+            parts[field] = None
+    return Timex(**parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_number(value: str):
+    """Decode a number from a resolution string. Returns an int, a float or None if it is not a number."""
+    text = value.replace(',', '').strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+DateTimeResolution = collections.namedtuple('DateTimeResolution', ['kind', 'timex', 'comment'])
+DateTimeResolution.__doc__ = """Resolution of a builtin.datetime entity.
+
+kind is the key LUIS used for the expression: date, time, set or duration.
+timex is the decoded Timex and comment is the extra comment LUIS gave, e.g. ampm, or None.
+"""
+
+NumberResolution = collections.namedtuple('NumberResolution', ['value', 'unit'])
+NumberResolution.__doc__ = """Resolution of a numeric builtin entity such as builtin.number or builtin.money.
+
+value is an int or a float, unit is the unit given by LUIS or None.
+"""
+
+_DATETIME_KINDS = ('date', 'time', 'set', 'duration')
+
+
+def decode_resolution(entity_type: str, resolution):
+    """Decode the raw resolution of an entity into a DateTimeResolution or a NumberResolution.
+
+    Returns None if the resolution is empty or of an unknown kind.
+    """
+    if not resolution or not isinstance(resolution, dict) or not entity_type:
+        return None
+    if entity_type.startswith('builtin.datetime'):
+        for kind in _DATETIME_KINDS:
+            if kind in resolution:
+                return DateTimeResolution(kind, parse_timex(resolution[kind]), resolution.get('comment'))
+        return None
+    if entity_type.startswith('builtin.') and isinstance(resolution.get('value'), str):
+        value = parse_number(resolution['value'])
+        if value is not None:
+            return NumberResolution(value, resolution.get('unit'))
+    return None
+
+
+_NOT_DECODED = object()
+
+
 class BaseEntity:
     """A class representing a basic LUIS entity without information about placement and score.
 
     Attributes
     ----------
+    json: dict
+        The original json of the entity.
     type : str
         The entity type
     value : str
         The value of the entity
-    resolution: str
-        Not sure what this is
-        # TODO: Figure out what kind of object the resolution is
+    resolution: dict
+        The raw resolution returned by LUIS for builtin entities. Empty or None for other entities.
+    typed_resolution: DateTimeResolution or NumberResolution
+        The resolution decoded on first access. None if there is nothing to decode.
     """
     def __init__(self, entity: dict):
         """
@@ -114,12 +253,20 @@ class BaseEntity:
             Dictionary containing the values needed for initializing the BaseEntity.
             The values has to be immediately accessible from the dictionary.
         """
+        self.json = entity
         self.type = entity['type']
         self.value = entity['entity']
         try:
             self.resolution = entity['resolution']
         except KeyError:
             self.resolution = None
+        self._typed_resolution = _NOT_DECODED
+
+    @property
+    def typed_resolution(self):
+        if self._typed_resolution is _NOT_DECODED:
+            self._typed_resolution = decode_resolution(self.type, self.resolution)
+        return self._typed_resolution
 
 
 class Entity(BaseEntity):
@@ -127,6 +274,8 @@ class Entity(BaseEntity):
 
     Attributes
     ----------
+    json: dict
+        The original json of the entity.
     type : str
         The entity type
     value : str
@@ -137,9 +286,10 @@ class Entity(BaseEntity):
         The index of the last letter of the entity in the query string
     score : double
         The score (probability??) of this entity being correct
-    resolution: str
-        Not sure what this is
-        # TODO: Figure out what kind of object the resolution is
+    resolution: dict
+        The raw resolution returned by LUIS for builtin entities. Empty or None for other entities.
+    typed_resolution: DateTimeResolution or NumberResolution
+        The resolution decoded on first access. None if there is nothing to decode.
     """
     def __init__(self, entity: dict):
         """
@@ -188,6 +338,8 @@ class Dialog:
 
     Attributes
     ----------
+    json: dict
+        The original json of the dialog.
     context_id : str (as a GUID)
         The id of the dialog
     status : str
@@ -213,6 +365,7 @@ class Dialog:
             Dictionary containing the values needed for initializing the Parameter.
             The values has to be immediately accessible from the dictionary.
         """
+        self.json = dialog
         self.context_id = dialog['contextId']
         self.status = dialog['status']  # TODO: change to enum or something
         if self.status != 'Finished':
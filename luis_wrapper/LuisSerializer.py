@@ -0,0 +1,161 @@
+"""Compact binary serialization of LUIS responses and conversations.
+
+The format stores the original json of each response, which is all that is needed to rebuild the parsed objects.
+The json is encoded with marshal, which is decoded in C and stores strings that occur more than once only once,
+so the result is both smaller than json and faster to load than pickle.
+
+Layout::
+
+    header  magic (4 bytes) | version (uint8) | kind (uint8) | crc32 of the body (uint32, little endian)
+    body    marshal (version 4) of the json of a single response, intent, entity or dialog,
+            or of the list of response jsons for a conversation
+
+marshal is not meant for untrusted data, so only load data created by dumps, e.g. from a local cache.
+The checksum is verified before decoding, so corrupt data is rejected before marshal sees it.
+Run python -m benchmarks.bench_serializer to compare the speed and size with json and pickle.
+"""
+import marshal
+import struct
+import zlib
+
+from luis_wrapper.LuisResponse import Response, Intent, Entity, Dialog
+
+MAGIC = b'LUIS'
+VERSION = 2
+
+_MARSHAL_VERSION = 4
+
+_KIND_RESPONSE = 0
+_KIND_CONVERSATION = 1
+_KIND_INTENT = 2
+_KIND_ENTITY = 3
+_KIND_DIALOG = 4
+
+# Parts of a response are stored as their original json, like responses
+_PART_KINDS = ((Intent, _KIND_INTENT), (Entity, _KIND_ENTITY), (Dialog, _KIND_DIALOG))
+_PART_CLASSES = {kind: cls for cls, kind in _PART_KINDS}
+
+_HEADER = struct.Struct('<4sBBI')
+
+# Raised by marshal for corrupt data, and by the parsing classes for json that does not have the expected shape
+_CORRUPT_DATA_ERRORS = (ValueError, EOFError, TypeError, KeyError, IndexError, AttributeError, AssertionError)
+
+
+class SerializationError(ValueError):
+    """Raised when data cannot be serialized or deserialized"""
+    pass
+
+
+def dumps(obj) -> bytes:
+    """Serialize a Response, Conversation, Intent, Entity or Dialog to bytes.
+
+    Parameters
+    ----------
+    obj : Response, Conversation, Intent, Entity or Dialog
+        The object to serialize.
+        Anything with a ``responses`` attribute is treated as a conversation.
+
+    Returns
+    -------
+    bytes
+        The serialized object
+    """
+    if isinstance(obj, Response):
+        kind, value = _KIND_RESPONSE, obj.json
+    elif hasattr(obj, 'responses'):
+        kind, value = _KIND_CONVERSATION, [response.json for response in obj.responses]
+    else:
+        for cls, kind in _PART_KINDS:
+            if isinstance(obj, cls):
+                value = obj.json
+                break
+        else:
+            raise SerializationError('Cannot serialize object of type {}'.format(type(obj).__name__))
+    try:
+        body = marshal.dumps(_share_strings(value, {}), _MARSHAL_VERSION)
+    except ValueError as err:
+        raise SerializationError('Cannot serialize the json of the {}: {}'.format(type(obj).__name__, err))
+    return _HEADER.pack(MAGIC, VERSION, kind, zlib.crc32(body)) + body
+
+
+def loads(data):
+    """Deserialize bytes created by dumps.
+
+    The body is decoded directly from the given buffer without copying it.
+
+    Parameters
+    ----------
+    data : bytes, bytearray or memoryview
+        The serialized object
+
+    Returns
+    -------
+    Response, Conversation, Intent, Entity or Dialog
+        The deserialized object
+    """
+    view = memoryview(data)
+    try:
+        magic, version, kind, checksum = _HEADER.unpack_from(view, 0)
+    except struct.error:
+        raise SerializationError('Data is too short to contain a header')
+    if magic != MAGIC:
+        raise SerializationError('Data does not start with the expected magic bytes')
+    if version != VERSION:
+        raise SerializationError('Unsupported format version {}'.format(version))
+    if kind not in (_KIND_RESPONSE, _KIND_CONVERSATION) and kind not in _PART_CLASSES:
+        raise SerializationError('Unknown object kind {}'.format(kind))
+    body = view[_HEADER.size:]
+    if zlib.crc32(body) != checksum:
+        raise SerializationError('Data is truncated or corrupt')
+    try:
+        value = marshal.loads(body)
+        if kind == _KIND_RESPONSE:
+            return Response(_json_object(value))
+        if kind == _KIND_CONVERSATION:
+            return _conversation(value)
+        return _PART_CLASSES[kind](_json_object(value))
+    except SerializationError:
+        raise
+    except _CORRUPT_DATA_ERRORS as err:
+        raise SerializationError('Data is truncated or corrupt') from err
+
+
+def _share_strings(value, strings: dict):
+    """Copy of the json where equal strings are the same object, so marshal writes each of them only once"""
+    share = strings.setdefault
+    if type(value) is dict:
+        items = value.items()
+    elif type(value) is list:
+        items = enumerate(value)
+    else:
+        return share(value, value) if type(value) is str else value
+    result = {} if type(value) is dict else [None] * len(value)
+    for key, item in items:
+        kind = type(item)
+        if kind is str:
+            item = share(item, item)
+        elif kind is dict or kind is list:
+            item = _share_strings(item, strings)
+        if type(key) is str:
+            key = share(key, key)
+        result[key] = item
+    return result
+
+
+def _json_object(value) -> dict:
+    if not isinstance(value, dict):
+        raise SerializationError('Data does not contain a json object')
+    return value
+
+
+def _conversation(value):
+    # Imported here so parsing stored payloads does not depend on the client module
+    from luis_wrapper.LuisClient import Conversation
+    if not isinstance(value, list):
+        raise SerializationError('Data does not contain a list of responses')
+    if not value:
+        raise SerializationError('A conversation must contain at least one response')
+    conversation = Conversation(Response(_json_object(value[0])))
+    for response in value[1:]:
+        conversation.add_response(Response(_json_object(response)))
+    return conversation
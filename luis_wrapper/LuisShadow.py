@@ -0,0 +1,178 @@
+import logging
+import queue
+import random
+import threading
+import time
+
+from luis_wrapper.LuisConcurrency import PRIORITY_BULK
+from luis_wrapper.LuisDeadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def _summarize(response) -> tuple:
+    """The parts of a response that are compared, so the response itself does not have to be kept"""
+    entities = frozenset((e.type, e.start_index, e.end_index) for e in response.entities)
+    return response.top_scoring_intent.name, entities
+
+
+class ShadowTraffic:
+    """Mirrors a sample of the new queries to a candidate app and compares the answers.
+
+All new queries are sampled, including those answered by the cache or the pre-classifier of the live client.
+
+    Queries are mirrored in background threads through a bounded queue. When the queue is full, the query is
+    dropped instead of waiting, so the shadow traffic never slows down the live requests.
+    Only the top scoring intents and entity spans are compared, and only the agreement counts are kept.
+
+    Attributes
+    ----------
+    client : Client
+        Client for the candidate app
+    sample_rate : float
+        Fraction of the queries that are mirrored
+    deadline : float
+        Number of seconds each mirrored query may take
+    sampled : int
+        Number of queries selected for mirroring
+    dropped : int
+        Number of selected queries dropped because the queue was full
+    compared : int
+        Number of queries answered by both apps
+    errors : int
+        Number of mirrored queries that failed
+    intent_agreements : int
+        Number of compared queries with the same top scoring intent
+    entity_agreements : int
+        Number of compared queries with the same entities (type and position)
+    """
+    def __init__(self, client, sample_rate=0.01, queue_size=1000, workers=1, deadline=None, random_=random.random):
+        """
+
+        Parameters
+        ----------
+        client : Client
+            Client for the candidate app
+        sample_rate : float (0.01)
+            Fraction of the queries that are mirrored
+        queue_size : int (1000)
+            Maximum number of queries waiting to be mirrored
+        workers : int (1)
+            Number of threads sending the mirrored queries
+        deadline : float (None)
+            Number of seconds each mirrored query may take, so a hanging candidate cannot block the workers.
+            Uses the default deadline of the candidate client if None, or 10 seconds if it has none.
+        random_ : callable (random.random)
+            Function returning a random number in [0, 1)
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be between 0 and 1')
+        self.client = client
+        self.sample_rate = sample_rate
+        if deadline is None:
+            deadline = client.default_deadline if client is not None else None
+        self.deadline = deadline if deadline is not None else 10.0
+        self.sampled = 0
+        self.dropped = 0
+        self.compared = 0
+        self.errors = 0
+        self.intent_agreements = 0
+        self.entity_agreements = 0
+        self._random = random_
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._worker_count = workers
+        self._workers = []
+        self._abandon = threading.Event()
+
+    def submit(self, text: str, response):
+        """Mirror the query to the candidate app if it is sampled. Never blocks.
+
+        Parameters
+        ----------
+        text : str
+            The cleaned query
+        response : Response
+            The response from the live app
+        """
+        if self._random() >= self.sample_rate:
+            return
+        self._start_workers()
+        with self._lock:
+            self.sampled += 1
+        try:
+            self._queue.put_nowait((text, _summarize(response)))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        """The counters, and the agreement rates of the compared queries"""
+        with self._lock:
+            return {
+                'sampled': self.sampled,
+                'dropped': self.dropped,
+                'compared': self.compared,
+                'errors': self.errors,
+                'intent_agreement': self.intent_agreements / self.compared if self.compared else 0.0,
+                'entity_agreement': self.entity_agreements / self.compared if self.compared else 0.0
+            }
+
+    def close(self, timeout=None):
+        """Finish the queued queries and stop the worker threads.
+
+        Parameters
+        ----------
+        timeout : float (None)
+            Maximum number of seconds to wait. The queries still queued when it expires are dropped.
+            None waits until all queued queries are done.
+        """
+        expires_at = None if timeout is None else time.monotonic() + timeout
+
+        def remaining():
+            return None if expires_at is None else max(0.0, expires_at - time.monotonic())
+
+        for _ in self._workers:
+            try:
+                self._queue.put(_STOP, timeout=remaining())
+            except queue.Full:
+                logger.warning('Timed out closing shadow traffic, dropping the queued queries')
+                self._abandon.set()
+                break
+        for worker in self._workers:
+            worker.join(remaining())
+        self._workers = []
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            workers = [threading.Thread(target=self._work, name='luis-shadow-{}'.format(i), daemon=True)
+                       for i in range(self._worker_count)]
+            for worker in workers:
+                worker.start()
+            self._workers = workers
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP or self._abandon.is_set():
+                return
+            text, (live_intent, live_entities) = item
+            try:
+                url = self.client._build_base_url(text)
+                response = self.client._get_response(url, PRIORITY_BULK, Deadline(self.deadline))
+                shadow_intent, shadow_entities = _summarize(response)
+            except Exception:
+                logger.debug('Shadow request failed', exc_info=True)
+                with self._lock:
+                    self.errors += 1
+                continue
+            with self._lock:
+                self.compared += 1
+                self.intent_agreements += shadow_intent == live_intent
+                self.entity_agreements += shadow_entities == live_entities
@@ -0,0 +1,177 @@
+"""Transports used by the Client to send requests to LUIS.
+
+A transport takes a url and returns the decoded json body of the response.
+When a timeout is given and it expires, the transport raises a TimeoutError.
+A timeout of zero or less raises a TimeoutError without sending the request.
+When LUIS answers with an error status, the transport raises a TransportError.
+All transports ask for compressed responses, since verbose LUIS responses can be large.
+"""
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class TransportError(IOError):
+    """Raised by transports when LUIS answers with an error status
+
+    Attributes
+    ----------
+    status_code : int
+        The HTTP status code returned by LUIS
+    """
+    def __init__(self, status_code: int, message=''):
+        super(TransportError, self).__init__('{} {}'.format(status_code, message).strip())
+        self.status_code = status_code
+
+
+def _check_timeout(timeout):
+    """Raise TimeoutError if no time is left for the request"""
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError('No time left to send the request')
+
+
+class Transport:
+    """Base class for transports"""
+    def get(self, url: str, timeout=None) -> dict:
+        """Send a GET request to the url and return the decoded json body.
+
+        Parameters
+        ----------
+        url : str
+            The url
+        timeout : float (None)
+            Maximum number of seconds to wait for LUIS. None waits forever.
+            A TimeoutError is raised without sending the request if it is zero or less.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the connections held by the transport"""
+        pass
+
+
+class RequestsTransport(Transport):
+    """Transport using the requests library.
+
+    Without a session a new connection is made for every request.
+    Give a requests.Session to keep connections alive between requests.
+    """
+    def __init__(self, session=None):
+        """
+
+        Parameters
+        ----------
+        session : requests.Session (None)
+            Session used to send the requests
+        """
+        self.session = session
+
+    def get(self, url: str, timeout=None) -> dict:
+        # Imported on first use so code that only parses stored responses does not pay for the HTTP stack
+        import requests
+        _check_timeout(timeout)
+        getter = self.session.get if self.session is not None else requests.get
+        try:
+            r = getter(url, headers={'Accept-Encoding': ACCEPT_ENCODING}, timeout=timeout)
+        except requests.Timeout as err:
+            raise TimeoutError(str(err)) from err
+        try:
+            r.raise_for_status()
+        except requests.HTTPError as err:
+            raise TransportError(err.response.status_code, err.response.reason) from err
+        return r.json()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class Http2Transport(Transport):
+    """Transport multiplexing all requests over HTTP/2 connections.
+
+    Requires the httpx library installed with HTTP/2 support (pip install luis_wrapper[http2]).
+    The transport is thread safe, so one instance can be shared by many threads.
+    """
+    def __init__(self, **client_options):
+        """
+
+        Parameters
+        ----------
+        client_options
+            Extra keyword arguments given to httpx.Client
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError('Http2Transport requires httpx. Install it with: pip install luis_wrapper[http2]')
+        headers = client_options.pop('headers', {})
+        headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+        self.client = httpx.Client(http2=True, headers=headers, **client_options)
+
+    def get(self, url: str, timeout=None) -> dict:
+        import httpx
+        _check_timeout(timeout)
+        try:
+            r = self.client.get(url, timeout=timeout)
+        except httpx.TimeoutException as err:
+            raise TimeoutError(str(err)) from err
+        if r.is_error:
+            raise TransportError(r.status_code, r.reason_phrase)
+        return r.json()
+
+    def close(self):
+        self.client.close()
+
+
+class StubTransport(Transport):
+    """In-process transport returning canned responses. Used for testing.
+
+    Attributes
+    ----------
+    urls : list[str]
+        The urls requested, in order
+    timeouts : list[float]
+        The timeouts given with each request, in order
+    """
+    def __init__(self, responses, delay=0.0):
+        """
+
+        Parameters
+        ----------
+        responses : dict or callable
+            Maps a url to the json body to return. Either a dict or a function taking the url.
+            A body that is an int is treated as an error status code and raises a TransportError.
+            Bodies given as str or bytes are decoded as json.
+        delay : float (0.0)
+            Number of seconds each request takes. A TimeoutError is raised if the delay is longer than the timeout.
+        """
+        self.responses = responses
+        self.delay = delay
+        self.urls = []
+        self.timeouts = []
+
+    def get(self, url: str, timeout=None) -> dict:
+        self.urls.append(url)
+        self.timeouts.append(timeout)
+        _check_timeout(timeout)
+        if self.delay:
+            if timeout is not None and self.delay > timeout:
+                time.sleep(timeout)
+                raise TimeoutError('Stub request timed out after {} seconds'.format(timeout))
+            time.sleep(self.delay)
+        if callable(self.responses):
+            body = self.responses(url)
+        else:
+            try:
+                body = self.responses[url]
+            except KeyError:
+                raise TransportError(404, 'No stub response for {}'.format(url))
+        if isinstance(body, int):
+            raise TransportError(body)
+        if isinstance(body, (str, bytes)):
+            body = json.loads(body)
+        return body
@@ -23,5 +23,9 @@ setup(
         'Programming Language :: Python :: 3',
     ],
     install_requires=['requests'],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'http2': ['httpx[http2]']
+    },
     license='MIT'
 )
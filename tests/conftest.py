@@ -0,0 +1,36 @@
+"""Helpers shared by the tests.
+
+Import them in a test module with ``from conftest import create_json``.
+"""
+from luis_wrapper.LuisResponse import Response
+
+
+def create_json(query='hello', intent_name='Greeting', entities=(), dialog=None, score=0.9):
+    """Json of a LUIS response with a single intent and a Location entity for each of the given entity texts"""
+    json_ = {
+        'query': query,
+        'topScoringIntent': {'intent': intent_name, 'score': score},
+        'intents': [{'intent': intent_name, 'score': score}],
+        'entities': [{'entity': e, 'type': 'Location', 'startIndex': max(query.find(e), 0),
+                      'endIndex': max(query.find(e), 0) + len(e) - 1, 'score': 0.9} for e in entities]
+    }
+    if dialog:
+        json_['dialog'] = dialog
+    return json_
+
+
+def create_response(*args, **kwargs) -> Response:
+    """Response parsed from create_json"""
+    return Response(create_json(*args, **kwargs))
+
+
+BODY = create_json()
+
+
+class FakeClock:
+    """Clock that only moves when a test changes now"""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
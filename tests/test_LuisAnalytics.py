@@ -0,0 +1,112 @@
+import pytest
+import os
+import sys
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisAnalytics import ParquetSink, _ColumnBuffer
+from conftest import create_json
+
+DIALOG = {'contextId': 'an id', 'status': 'Question', 'prompt': 'Where?',
+          'parameterName': 'Location', 'parameterType': 'Location'}
+
+
+def create_response(query, with_dialog=False):
+    json_ = create_json(query, 'GetWeather', ['copenhagen'], DIALOG if with_dialog else None)
+    json_['intents'].append({'intent': 'None', 'score': 0.1})
+    return Response(json_)
+
+
+def test_Given_Responses_When_Buffering_Then_RowsAreSplitIntoTables():
+    buffer = _ColumnBuffer()
+    buffer.add(0, create_response('first', with_dialog=True))
+    buffer.add(1, create_response('second'))
+    assert buffer.responses == 2
+    assert buffer.columns['queries']['query'] == ['first', 'second']
+    assert buffer.columns['queries']['intent_scores'] == [[0.9, 0.1], [0.9, 0.1]]
+    assert buffer.columns['entities']['response_id'] == [0, 1]
+    assert buffer.columns['entities']['start_index'] == [0, 0]
+    assert buffer.columns['dialogs']['response_id'] == [0]
+    assert buffer.columns['dialogs']['prompt'] == ['Where?']
+
+
+def test_Given_PyarrowIsMissing_When_CreatingSink_Then_ImportErrorIsRaised(monkeypatch, tmpdir):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(ImportError) as err:
+        ParquetSink(str(tmpdir))
+    assert 'pyarrow' in str(err.value)
+
+
+def test_Given_Responses_When_Streaming_Then_ParquetFilesContainAllRows(tmpdir):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    with ParquetSink(str(tmpdir), batch_size=2) as sink:
+        for i in range(5):
+            sink.add(create_response('query {}'.format(i), with_dialog=i == 0))
+    assert sink.written == 5
+    queries = pq.read_table(sink.path('queries', 0))
+    assert queries.column('query').to_pylist() == ['query {}'.format(i) for i in range(5)]
+    assert set(queries.column('run_id').to_pylist()) == {sink.run_id}
+    assert pq.ParquetFile(sink.path('queries', 0)).num_row_groups == 3
+    assert pq.read_table(sink.path('entities', 0)).num_rows == 5
+    assert pq.read_table(sink.path('dialogs', 0)).column('response_id').to_pylist() == [0]
+
+
+def test_Given_TwoSinksOnSameDirectory_When_Streaming_Then_NoRowsAreOverwritten(tmpdir):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    with ParquetSink(str(tmpdir)) as first:
+        for i in range(3):
+            first.add(create_response('run1'))
+    with ParquetSink(str(tmpdir)) as second:
+        second.add(create_response('run2'))
+    queries = pq.read_table(os.path.join(str(tmpdir), 'queries'))
+    assert sorted(queries.column('query').to_pylist()) == ['run1'] * 3 + ['run2']
+    keys = set(zip(queries.column('run_id').to_pylist(), queries.column('response_id').to_pylist()))
+    assert len(keys) == 4
+
+
+def test_Given_RowsPerFile_When_Streaming_Then_FilesAreRolled(tmpdir):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    with ParquetSink(str(tmpdir), batch_size=2, rows_per_file=4) as sink:
+        for i in range(9):
+            sink.add(create_response('query {}'.format(i)))
+    query_files = [f for f in sink.files if os.sep + 'queries' + os.sep in f]
+    assert [pq.read_table(f).num_rows for f in query_files] == [4, 4, 1]
+    assert pq.read_table(os.path.join(str(tmpdir), 'queries')).column('response_id').to_pylist() == list(range(9))
+
+
+def test_Given_FailingWriter_When_Adding_Then_ErrorIsCountedNotRaised(tmpdir, monkeypatch):
+    pytest.importorskip('pyarrow')
+    sink = ParquetSink(str(tmpdir), batch_size=1)
+
+    def fail(buffer):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(sink, '_write', fail)
+    sink.add(create_response('hello'))
+    sink.close()
+    assert (sink.errors, sink.dropped, sink.written) == (1, 1, 0)
+
+
+def test_Given_Sink_When_Analyzing_Then_ResponsesFromLuisAreAdded():
+    from luis_wrapper.LuisClient import Client
+    from luis_wrapper.LuisTransport import StubTransport
+
+    class ListSink(list):
+        add = list.append
+    sink = ListSink()
+    client = Client('An app id', 'A subscription key', sink=sink,
+                    transport=StubTransport(lambda url: create_response('hello').json))
+    conversation = client.analyze('hello')
+    assert sink == [conversation.last_response]
+
+
+def test_Given_FailingSink_When_Analyzing_Then_ResponseIsStillReturned():
+    from luis_wrapper.LuisClient import Client
+    from luis_wrapper.LuisTransport import StubTransport
+
+    class FailingSink:
+        def add(self, response):
+            raise OSError('No space left on device')
+    client = Client('An app id', 'A subscription key', sink=FailingSink(),
+                    transport=StubTransport(lambda url: create_response('hello').json))
+    assert client.analyze('hello').last_response.query == 'hello'
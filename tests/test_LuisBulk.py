@@ -0,0 +1,54 @@
+import pytest
+import collections
+import json
+import os
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisBulk import iter_responses, map_chunks
+from conftest import create_json
+
+
+def get_query(response):
+    return response.query
+
+
+def count_intents(responses):
+    return collections.Counter(r.top_scoring_intent.name for r in responses)
+
+
+@pytest.fixture
+def payload_file(tmpdir):
+    path = os.path.join(str(tmpdir), 'payloads.jsonl')
+    with open(path, 'w') as f:
+        for i in range(100):
+            f.write(json.dumps(create_json('query {}'.format(i), 'Intent{}'.format(i % 3))) + '\n')
+        f.write('\n')
+    return path
+
+
+def parse_serially(path):
+    with open(path, 'r') as f:
+        return [Response(json.loads(line)) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 10 ** 6])
+def test_Given_PayloadFile_When_IteratingResponses_Then_AllResponsesAreReturnedInOrder(payload_file, chunk_size):
+    queries = list(iter_responses(payload_file, get_query, workers=2, chunk_size=chunk_size))
+    assert queries == [r.query for r in parse_serially(payload_file)]
+    assert queries == ['query {}'.format(i) for i in range(100)]
+
+
+def test_Given_NoTransform_When_IteratingResponses_Then_TypeErrorIsRaised(payload_file):
+    with pytest.raises(TypeError):
+        list(iter_responses(payload_file, None, workers=1))
+
+
+def test_Given_Summarizer_When_MappingChunks_Then_SummariesCanBeCombined(payload_file):
+    total = sum(map_chunks(payload_file, count_intents, workers=2, chunk_size=500, max_pending=1),
+                collections.Counter())
+    assert total == {'Intent0': 34, 'Intent1': 33, 'Intent2': 33}
+
+
+def test_Given_EmptyFile_When_IteratingResponses_Then_NothingIsReturned(tmpdir):
+    path = os.path.join(str(tmpdir), 'empty.jsonl')
+    open(path, 'w').close()
+    assert list(iter_responses(path, get_query, workers=1)) == []
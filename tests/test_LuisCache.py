@@ -0,0 +1,155 @@
+import pytest
+import multiprocessing
+import os
+import sqlite3
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisTransport import StubTransport
+from luis_wrapper.LuisCache import SharedMemoryCache, SQLiteCache
+from conftest import create_json, FakeClock
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return os.path.join(str(tmpdir), 'luis_cache')
+
+
+def store_in_child(path, key):
+    cache = SharedMemoryCache(path, slots=16, slot_size=1024, ways=4)
+    cache.set(key, Response(create_json('from child')))
+    cache.close()
+
+
+def open_in_child(path, slots):
+    with pytest.raises(ValueError):
+        SharedMemoryCache(path, slots=slots, slot_size=1024, ways=4)
+
+
+class TestSharedMemoryCache:
+
+    def test_Given_StoredResponse_When_Getting_Then_ResponseIsReturned(self, cache_path):
+        cache = SharedMemoryCache(cache_path, slots=16, slot_size=1024, ways=4)
+        assert cache.get('app/hello') is None
+        cache.set('app/hello', Response(create_json('hello')))
+        assert cache.get('app/hello').json == create_json('hello')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_Given_ResponseStoredByOtherProcess_When_Getting_Then_ResponseIsReturned(self, cache_path):
+        cache = SharedMemoryCache(cache_path, slots=16, slot_size=1024, ways=4)
+        child = multiprocessing.get_context('fork').Process(target=store_in_child, args=(cache_path, 'app/key'))
+        child.start()
+        child.join()
+        assert child.exitcode == 0
+        assert cache.get('app/key').query == 'from child'
+
+    def test_Given_FullSet_When_Setting_Then_LeastRecentlyUsedEntryIsEvicted(self, cache_path):
+        cache = SharedMemoryCache(cache_path, slots=4, slot_size=1024, ways=4)
+        for i in range(4):
+            cache.set(str(i), Response(create_json(str(i))))
+        cache.get('0')
+        cache.set('4', Response(create_json('4')))
+        assert cache.get('1') is None
+        assert [cache.get(k).query for k in ['0', '2', '3', '4']] == ['0', '2', '3', '4']
+
+    def test_Given_TooLargeResponse_When_Setting_Then_ItIsNotCached(self, cache_path):
+        cache = SharedMemoryCache(cache_path, slots=4, slot_size=64, ways=4)
+        cache.set('key', Response(create_json('hello')))
+        assert cache.get('key') is None
+
+    def test_Given_FileInUseWithOtherDimensions_When_Opening_Then_ExceptionIsRaisedAndFileIsKept(self, cache_path):
+        cache = SharedMemoryCache(cache_path, slots=64, slot_size=1024, ways=4)
+        cache.set('key', Response(create_json('hello')))
+        child = multiprocessing.get_context('fork').Process(target=open_in_child, args=(cache_path, 4))
+        child.start()
+        child.join()
+        assert child.exitcode == 0
+        assert cache.get('key').query == 'hello'
+
+    def test_Given_FileThatIsNotACache_When_Opening_Then_ExceptionIsRaised(self, cache_path):
+        with open(cache_path, 'wb') as f:
+            f.write(b'something else')
+        with pytest.raises(ValueError):
+            SharedMemoryCache(cache_path, slots=4, slot_size=1024, ways=4)
+        with open(cache_path, 'rb') as f:
+            assert f.read() == b'something else'
+
+    @pytest.mark.parametrize("slots, slot_size, ways", [(10, 1024, 4), (0, 1024, 1), (4, 8, 4)])
+    def test_Given_InvalidDimensions_When_Initializing_Then_ExceptionIsRaised(self, cache_path, slots, slot_size,
+                                                                               ways):
+        with pytest.raises(ValueError):
+            SharedMemoryCache(cache_path, slots=slots, slot_size=slot_size, ways=ways)
+
+
+class TestSQLiteCache:
+
+    def test_Given_StoredResponse_When_Reopening_Then_ResponseIsStillCached(self, cache_path):
+        cache = SQLiteCache(cache_path, app_version='0.1')
+        cache.set('app/hello', Response(create_json('hello')))
+        cache.close()
+        cache = SQLiteCache(cache_path, app_version='0.1')
+        assert cache.get('app/hello').json == create_json('hello')
+        assert cache.get('app/other') is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_Given_NewAppVersion_When_Reopening_Then_StaleEntriesAreFlushed(self, cache_path):
+        cache = SQLiteCache(cache_path, app_version='0.1')
+        cache.set('app/hello', Response(create_json('hello')))
+        cache.close()
+        assert SQLiteCache(cache_path, app_version='0.2').get('app/hello') is None
+        assert SQLiteCache(cache_path, app_version='0.1').get('app/hello') is None
+
+    def test_Given_ExpiredEntry_When_Getting_Then_NoneIsReturned(self, cache_path):
+        clock = FakeClock(1000.0)
+        cache = SQLiteCache(cache_path, app_version='0.1', ttl=60, clock=clock)
+        cache.set('default', Response(create_json('default')))
+        cache.set('long', Response(create_json('long')), ttl=600)
+        clock.now += 61
+        assert cache.get('default') is None
+        assert cache.get('long') is not None
+
+    def test_Given_UsedEntries_When_PreloadingOnStart_Then_HottestEntriesAreInMemory(self, cache_path):
+        cache = SQLiteCache(cache_path, app_version='0.1')
+        for key, uses in [('cold', 1), ('hot', 5), ('warm', 3)]:
+            cache.set(key, Response(create_json(key)))
+            for _ in range(uses):
+                cache.get(key)
+        cache.close()
+        cache = SQLiteCache(cache_path, app_version='0.1', preload=2)
+        assert sorted(cache._memory) == ['hot', 'warm']
+        assert cache.get('hot').query == 'hot'
+
+
+class TestClient:
+
+    def test_Given_Cache_When_AskingSameQueryTwice_Then_LuisIsCalledOnce(self, cache_path):
+        transport = StubTransport(lambda url: create_json('hello'))
+        client = Client('An app id', 'A subscription key', transport=transport,
+                        cache=SharedMemoryCache(cache_path, slots=16, slot_size=1024, ways=4))
+        first = client.analyze('hello')
+        second = client.analyze('hello')
+        assert len(transport.urls) == 1
+        assert first.last_response.json == second.last_response.json
+
+    def test_Given_ResponseWithDialog_When_Asking_Then_ResponseIsNotCached(self, cache_path):
+        json_ = dict(create_json('weather'), dialog={'contextId': 'id', 'status': 'Finished'})
+        transport = StubTransport(lambda url: json_)
+        client = Client('An app id', 'A subscription key', transport=transport,
+                        cache=SharedMemoryCache(cache_path, slots=16, slot_size=1024, ways=4))
+        client.analyze('weather')
+        client.analyze('weather')
+        assert len(transport.urls) == 2
+
+    def test_Given_BrokenCache_When_Asking_Then_LuisIsAskedAndErrorIsLogged(self, caplog):
+        class LockedCache:
+            def get(self, key):
+                raise sqlite3.OperationalError('database is locked')
+
+            def set(self, key, response):
+                raise sqlite3.OperationalError('database is locked')
+
+        transport = StubTransport(lambda url: create_json('hello'))
+        client = Client('An app id', 'A subscription key', transport=transport, cache=LockedCache())
+        assert client.analyze('hello').last_response.query == 'hello'
+        assert len(transport.urls) == 1
+        assert [r.getMessage() for r in caplog.records] == ['Failed reading the response from the cache',
+                                                            'Failed storing the response in the cache']
@@ -1,14 +1,23 @@
 import pytest
-
-from luis_wrapper.LuisClient import Client, Conversation
+import contextlib
+import os
+import subprocess
+import sys
+import time
+
+from luis_wrapper.LuisClient import Client, Conversation, Deadline, DeadlineExceeded
+from luis_wrapper.LuisConcurrency import AdaptiveLimiter, PriorityScheduler
+from luis_wrapper.LuisTransport import StubTransport
 from luis_wrapper.LuisResponse import Response, Dialog
+from luis_wrapper import LuisResponse
 from unittest.mock import MagicMock
+from conftest import BODY, FakeClock
 
 
 @pytest.fixture(scope='function')
 def response(monkeypatch):
-    monkeypatch.setattr('test_LuisClient.Response', MagicMock(Response))
-    monkeypatch.setattr('test_LuisClient.Dialog', MagicMock(Dialog))
+    monkeypatch.setattr('test_LuisClient.Response', MagicMock(LuisResponse.Response))
+    monkeypatch.setattr('test_LuisClient.Dialog', MagicMock(LuisResponse.Dialog))
     conversation_id = "A long GUID"
     d = Dialog
     monkeypatch.setattr(d, 'context_id', conversation_id, raising=False)
@@ -64,14 +73,14 @@ class TestClient:
 
 
     def test_Given_NonEmptyString_When_CallingAnalyze_Then_ConversationIsReturned(self, client, monkeypatch):
-        monkeypatch.setattr("requests.get", lambda _: self.FakeRequestsResponse())
+        monkeypatch.setattr("requests.get", lambda *_, **__: self.FakeRequestsResponse())
         monkeypatch.setattr("luis_wrapper.LuisClient.Response", lambda _: self.FakeResponse())
         input = "Hello there"
         result = client.analyze(input)
         assert isinstance(result, Conversation)
 
     def test_Given_ConversationGiven_When_CallingAnalyze_Then_SameConversationIsReturned(self, client, conversation, monkeypatch):
-        monkeypatch.setattr("requests.get", lambda _: self.FakeRequestsResponse())
+        monkeypatch.setattr("requests.get", lambda *_, **__: self.FakeRequestsResponse())
         monkeypatch.setattr("luis_wrapper.LuisClient.Response", lambda _: self.FakeResponse())
         conv = conversation
         new_conversation = client.analyze("Hello", conv)
@@ -103,14 +112,14 @@ class TestConversation:
         assert c.id == conversation_id
 
     def test_Given_InitialResponseWithoutDialog_When_Instantiating_Then_ConversationIDIsSetToNone(self, monkeypatch):
-        monkeypatch.setattr('test_LuisClient.Response', MagicMock(Response))
+        monkeypatch.setattr('test_LuisClient.Response', MagicMock(LuisResponse.Response))
         response = Response
         response.dialog = None
         c = Conversation(response)
         assert c.id is None
 
     def test_Given_NewResponseAdded_WhenOneResponseAlreadyExists_Then_ResponseListAndLastResponseIsUpdated(self, monkeypatch, conversation):
-        monkeypatch.setattr('test_LuisClient.Response', MagicMock(Response))
+        monkeypatch.setattr('test_LuisClient.Response', MagicMock(LuisResponse.Response))
         r = Response
         old_response = conversation.last_response
         lenght_before = len(conversation.responses)
@@ -124,8 +133,92 @@ class TestConversation:
         response.need_more_info = True
         c = Conversation(response)
         assert not c.conversation_is_finished()
-        monkeypatch.setattr('test_LuisClient.Response', MagicMock(Response))
+        monkeypatch.setattr('test_LuisClient.Response', MagicMock(LuisResponse.Response))
         r = Response
         r.need_more_info = False
         c.add_response(r)
         assert c.conversation_is_finished()
+
+
+class TestDeadline:
+
+    def test_Given_Deadline_When_Analyzing_Then_RemainingTimeIsUsedAsTimeout(self):
+        transport = StubTransport(lambda url: BODY)
+        client = Client('An app id', 'A subscription key', transport=transport)
+        client.analyze('hello', deadline=5)
+        client.analyze('hello')
+        assert 4 < transport.timeouts[0] <= 5
+        assert transport.timeouts[1] is None
+
+    def test_Given_SlowTransport_When_DeadlineExpires_Then_DeadlineExceededIsRaisedPromptly(self):
+        client = Client('An app id', 'A subscription key', transport=StubTransport(lambda url: BODY, delay=2))
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            client.analyze('hello', deadline=0.05)
+        assert time.monotonic() - start < 1
+        assert client.deadline_misses == 1
+
+    def test_Given_DefaultDeadline_When_AnalyzingWithoutDeadline_Then_DefaultIsUsed(self):
+        client = Client('An app id', 'A subscription key', transport=StubTransport(lambda url: BODY, delay=2),
+                        default_deadline=0.05)
+        with pytest.raises(DeadlineExceeded):
+            client.analyze('hello')
+
+    def test_Given_ExpiredConversationBudget_When_Replying_Then_LuisIsNotCalled(self):
+        transport = StubTransport(lambda url: BODY)
+        client = Client('An app id', 'A subscription key', transport=transport)
+        conversation = client.analyze('hello')
+        conversation.deadline = Deadline(0)
+        with pytest.raises(DeadlineExceeded):
+            client.analyze('hello', conversation, deadline=10)
+        assert len(transport.urls) == 1
+        assert client.deadline_misses == 1
+
+    def test_Given_FullScheduler_When_DeadlineExpiresWhileWaiting_Then_DeadlineExceededIsRaised(self):
+        scheduler = PriorityScheduler(capacity=1)
+        scheduler.acquire()
+        client = Client('An app id', 'A subscription key', transport=StubTransport(lambda url: BODY),
+                        scheduler=scheduler)
+        with pytest.raises(DeadlineExceeded):
+            client.analyze('hello', deadline=0.05)
+        assert scheduler.metrics()['queue_depth'] == {'interactive': 0, 'bulk': 0}
+
+    def test_Given_SlotFreedAtTheDeadline_When_Analyzing_Then_DeadlineExceededIsRaisedWithoutCallingLuis(self):
+        clock = FakeClock()
+
+        class SlowLimiter:
+            @contextlib.contextmanager
+            def request(self, timeout):
+                # The slot is granted on the last check of the wait, when no time is left
+                clock.now += timeout
+                yield
+
+        transport = StubTransport(lambda url: BODY)
+        client = Client('An app id', 'A subscription key', transport=transport, limiter=SlowLimiter())
+        with pytest.raises(DeadlineExceeded):
+            client.analyze('hello', deadline=Deadline(1.0, clock))
+        assert transport.urls == []
+        assert client.deadline_misses == 1
+
+    def test_Given_Limiter_When_CallersDeadlinesExpire_Then_LuisIsNotConsideredOverloaded(self):
+        limiter = AdaptiveLimiter(initial_limit=16)
+        client = Client('An app id', 'A subscription key', transport=StubTransport(lambda url: BODY, delay=0.05),
+                        limiter=limiter)
+        for _ in range(4):
+            with pytest.raises(DeadlineExceeded):
+                client.analyze('hello', deadline=0.01)
+        assert limiter.metrics() == {'limit': 16, 'in_flight': 0, 'queue_depth': 0, 'overloads': 0}
+        assert client.deadline_misses == 4
+
+    def test_Given_SeveralDeadlines_When_FindingEarliest_Then_EarliestIsReturned(self):
+        early, late = Deadline(1), Deadline(10)
+        assert Deadline.earliest(late, None, early) is early
+        assert Deadline.earliest(None, None) is None
+
+
+@pytest.mark.parametrize("module", ['luis_wrapper.LuisResponse', 'luis_wrapper.LuisClient'])
+def test_Given_FreshInterpreter_When_ImportingModule_Then_HttpStackIsNotImported(module):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    code = 'import sys; import {}; print("requests" in sys.modules)'.format(module)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=root, universal_newlines=True)
+    assert output.strip() == 'False'
@@ -0,0 +1,253 @@
+import pytest
+import math
+import random
+import threading
+import time
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisDeadline import DeadlineExceeded
+from luis_wrapper.LuisTransport import StubTransport, TransportError
+from luis_wrapper.LuisConcurrency import AdaptiveLimiter, PriorityScheduler, is_overload_error
+from conftest import BODY, FakeClock
+
+
+class CapacityServer:
+    """Stub server answering 429 when more requests than its capacity are in flight"""
+    def __init__(self, capacity, delay=0.002):
+        self.capacity = capacity
+        self.delay = delay
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        with self._lock:
+            self.in_flight += 1
+            overloaded = self.in_flight > self.capacity
+        try:
+            time.sleep(self.delay)
+            if overloaded:
+                with self._lock:
+                    self.rejected += 1
+                return 429
+            return BODY
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run_load(client, threads=16, requests_per_thread=20):
+    def worker():
+        for _ in range(requests_per_thread):
+            try:
+                client.analyze('hello')
+            except TransportError:
+                pass
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+@pytest.mark.parametrize("err, expected", [
+    (TransportError(429), True), (TransportError(503), True), (TransportError(404), False),
+    (TimeoutError(), True), (DeadlineExceeded(), False), (ValueError(), False)
+])
+def test_Given_Exception_When_Classifying_Then_OverloadIsDetected(err, expected):
+    assert is_overload_error(err) == expected
+
+
+class TestAdaptiveLimiter:
+
+    def test_Given_Overload_When_Releasing_Then_LimitIsDecreasedMultiplicatively(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 4
+        assert limiter.overloads == 1
+
+    def test_Given_SaturatedLimit_When_RequestsSucceed_Then_LimitIsIncreasedAdditively(self):
+        limiter = AdaptiveLimiter(initial_limit=2)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.acquire()
+            limiter.release(0.1)
+            limiter.release(0.1)
+        assert limiter.limit == 3
+
+    def test_Given_UnsaturatedLimit_When_RequestsSucceed_Then_LimitIsUnchanged(self):
+        limiter = AdaptiveLimiter(initial_limit=2)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert limiter.limit == 2
+
+    def test_Given_GrowingLatency_When_WindowEnds_Then_LimitIsDecreased(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial_limit=8, latency_tolerance=2.0, window=1.0, clock=clock)
+        for latency in [0.1, 0.1, 0.5, 0.5]:
+            limiter.acquire()
+            clock.now += 0.6
+            limiter.release(latency)
+        assert limiter.limit == 4
+
+    def test_Given_NoisyLatencyAndNoOverload_When_Releasing_Then_LimitIsKept(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial_limit=16, clock=clock)
+        rand = random.Random(0)
+        for _ in range(5000):
+            limiter.acquire()
+            clock.now += 0.01
+            limiter.release(rand.lognormvariate(math.log(0.08), 0.5))
+        assert limiter.limit == 16
+
+    def test_Given_FastNonOverloadError_When_Requesting_Then_LatencyIsIgnored(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial_limit=16, clock=clock)
+        with pytest.raises(TransportError):
+            with limiter.request():
+                clock.now += 0.002
+                raise TransportError(404)
+        for _ in range(5):
+            with limiter.request():
+                clock.now += 0.08
+        assert limiter.limit == 16
+        assert limiter.overloads == 0
+
+    def test_Given_BurstOfConcurrentOverloads_When_Releasing_Then_LimitIsDecreasedOnce(self):
+        clock = FakeClock()
+        limiter = AdaptiveLimiter(initial_limit=16, clock=clock)
+        for _ in range(8):
+            limiter.acquire()
+        clock.now += 0.1
+        for _ in range(8):
+            limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 8
+        assert limiter.overloads == 8
+        limiter.acquire()
+        clock.now += 0.1
+        limiter.release(0.1, overloaded=True)
+        assert limiter.limit == 4
+
+    def test_Given_FullLimit_When_Acquiring_Then_RequestWaitsInQueue(self):
+        limiter = AdaptiveLimiter(initial_limit=1)
+        limiter.acquire()
+        assert not limiter.acquire(timeout=0.01)
+        waiter = threading.Thread(target=limiter.acquire)
+        waiter.start()
+        time.sleep(0.05)
+        assert limiter.metrics() == {'limit': 1, 'in_flight': 1, 'queue_depth': 1, 'overloads': 0}
+        limiter.release(0.1)
+        waiter.join(1)
+        assert limiter.metrics()['queue_depth'] == 0
+
+    @pytest.mark.parametrize("initial, minimum, maximum", [(0, 1, 4), (5, 1, 4), (2, 3, 4)])
+    def test_Given_InvalidLimits_When_Initializing_Then_ExceptionIsRaised(self, initial, minimum, maximum):
+        with pytest.raises(ValueError):
+            AdaptiveLimiter(initial_limit=initial, min_limit=minimum, max_limit=maximum)
+
+
+def test_Given_ServerWithVaryingCapacity_When_Loading_Then_LimitFollowsCapacity():
+    server = CapacityServer(capacity=3)
+    limiter = AdaptiveLimiter(initial_limit=16, max_limit=32)
+    client = Client('An app id', 'A subscription key', transport=StubTransport(server), limiter=limiter)
+
+    run_load(client)
+    low_capacity_limit = limiter.limit
+    assert low_capacity_limit <= 6
+    # Without a limiter about 80% of the requests are rejected
+    assert server.rejected < 16 * 20 / 2
+
+    server.capacity = 24
+    run_load(client)
+    assert limiter.limit > low_capacity_limit
+    assert limiter.metrics()['in_flight'] == 0
+
+
+def test_Given_HealthyServerWithNoisyLatency_When_Loading_Then_LimitIsNotDecreased():
+    rand = random.Random(0)
+    limiter = AdaptiveLimiter(initial_limit=8, window=0.05)
+    client = Client('An app id', 'A subscription key', limiter=limiter,
+                    transport=StubTransport(lambda url: time.sleep(rand.lognormvariate(math.log(0.005), 0.5)) or BODY))
+    run_load(client, threads=8)
+    assert limiter.limit >= 8
+    assert limiter.overloads == 0
+
+
+def enqueue(scheduler, priorities, grants):
+    """Start a waiting thread for each priority, in order, and return the threads"""
+    lock = threading.Lock()
+
+    def worker(label, priority):
+        scheduler.acquire(priority)
+        with lock:
+            grants.append(label)
+        scheduler.release()
+
+    threads = []
+    for i, priority in enumerate(priorities):
+        queued = sum(scheduler.metrics()['queue_depth'].values())
+        thread = threading.Thread(target=worker, args=('{}{}'.format(priority[0], i), priority))
+        thread.start()
+        while sum(scheduler.metrics()['queue_depth'].values()) == queued:
+            time.sleep(0.001)
+        threads.append(thread)
+    return threads
+
+
+class TestPriorityScheduler:
+
+    def test_Given_QueuedBulkRequests_When_InteractiveRequestArrives_Then_ItIsServedFirst(self):
+        scheduler = PriorityScheduler(capacity=1)
+        scheduler.acquire('bulk')
+        grants = []
+        threads = enqueue(scheduler, ['bulk'] * 3 + ['interactive'] * 2, grants)
+        scheduler.release()
+        for thread in threads:
+            thread.join(1)
+        assert grants == ['i3', 'i4', 'b0', 'b1', 'b2']
+
+    def test_Given_BacklogOfBothClasses_When_Serving_Then_SlotsAreSharedByWeight(self):
+        scheduler = PriorityScheduler(capacity=1, weights={'interactive': 4, 'bulk': 1})
+        scheduler.acquire('interactive')
+        grants = []
+        threads = enqueue(scheduler, ['bulk'] * 4 + ['interactive'] * 16, grants)
+        scheduler.release()
+        for thread in threads:
+            thread.join(1)
+        # Bulk requests keep getting a share instead of waiting for all interactive requests
+        assert [g[0] for g in grants[:10]].count('b') == 2
+
+    def test_Given_FullScheduler_When_TimeoutExpires_Then_AcquireFailsAndQueueIsEmpty(self):
+        scheduler = PriorityScheduler(capacity=1)
+        scheduler.acquire()
+        assert not scheduler.acquire('bulk', timeout=0.01)
+        scheduler.release()
+        assert scheduler.metrics() == {'capacity': 1, 'in_flight': 0, 'queue_depth': {'interactive': 0, 'bulk': 0}}
+
+    def test_Given_Limiter_When_UsedAsCapacity_Then_CapacityFollowsLimit(self):
+        limiter = AdaptiveLimiter(initial_limit=8)
+        scheduler = PriorityScheduler(capacity=limiter)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        assert scheduler.capacity == 4
+
+    def test_Given_UnknownPriority_When_Acquiring_Then_ExceptionIsRaised(self):
+        with pytest.raises(ValueError):
+            PriorityScheduler().acquire('urgent')
+
+
+def test_Given_Scheduler_When_AnalyzingWithPriority_Then_PriorityIsUsed():
+    scheduler = PriorityScheduler(capacity=2)
+    priorities = []
+    original_request = scheduler.request
+
+    def request(priority, timeout=None):
+        priorities.append(priority)
+        return original_request(priority, timeout)
+    scheduler.request = request
+    client = Client('An app id', 'A subscription key', transport=StubTransport(lambda url: BODY), scheduler=scheduler)
+    client.analyze('hello')
+    client.analyze('hello', priority='bulk')
+    assert priorities == ['interactive', 'bulk']
+    assert scheduler.in_flight == 0
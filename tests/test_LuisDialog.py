@@ -0,0 +1,143 @@
+import pytest
+import asyncio
+import time
+from luis_wrapper.LuisDialog import DialogDriver
+from conftest import FakeClock
+
+
+class FakeConversation:
+    """Conversation that needs a number of replies before it is finished"""
+    def __init__(self, turns_needed):
+        self.texts = []
+        self.turns_needed = turns_needed
+        self.last_response = self
+        self.dialog = self
+        self.prompt = 'Where?'
+
+    def conversation_is_finished(self):
+        return len(self.texts) > self.turns_needed
+
+
+class FakeClient:
+    def __init__(self, turns_needed=1, delay=0.0):
+        self.turns_needed = turns_needed
+        self.delay = delay
+        self.started = 0
+        self.deadlines = []
+
+    def analyze(self, text, conversation=None, deadline=None):
+        self.deadlines.append(deadline)
+        time.sleep(self.delay)
+        if conversation is None:
+            self.started += 1
+            conversation = FakeConversation(self.turns_needed)
+        conversation.texts.append(text)
+        return conversation
+
+
+def test_Given_ConversationNeedingReply_When_Handling_Then_PromptAndFinishedCallbacksAreCalled():
+    events = []
+
+    async def on_finished(key, conversation):
+        events.append(('finished', key, conversation.texts))
+
+    driver = DialogDriver(FakeClient(), on_prompt=lambda key, prompt, _: events.append(('prompt', key, prompt)),
+                          on_finished=on_finished)
+
+    async def run():
+        await driver.handle('user', 'weather')
+        assert 'user' in driver.conversations
+        await driver.handle('user', 'copenhagen')
+
+    asyncio.run(run())
+    assert events == [('prompt', 'user', 'Where?'), ('finished', 'user', ['weather', 'copenhagen'])]
+    assert driver.conversations == {}
+
+
+def test_Given_ManyUsers_When_HandlingConcurrently_Then_EachUserGetsOwnConversation():
+    client = FakeClient()
+    driver = DialogDriver(client)
+
+    async def run():
+        await asyncio.gather(*(driver.handle(i, 'weather') for i in range(50)))
+        return await asyncio.gather(*(driver.handle(i, 'city {}'.format(i)) for i in range(50)))
+
+    conversations = asyncio.run(run())
+    assert client.started == 50
+    assert [c.texts for c in conversations] == [['weather', 'city {}'.format(i)] for i in range(50)]
+
+
+def test_Given_StaleConversation_When_Handling_Then_NewConversationIsStarted():
+    client = FakeClient()
+    clock = FakeClock()
+    driver = DialogDriver(client, max_idle=10, clock=clock)
+
+    async def run():
+        await driver.handle('user', 'weather')
+        clock.now = 11
+        return await driver.handle('user', 'weather')
+
+    conversation = asyncio.run(run())
+    assert client.started == 2
+    assert conversation.texts == ['weather']
+
+
+def test_Given_IdleConversations_When_ExpiringStale_Then_OnlyStaleOnesAreDropped():
+    clock = FakeClock()
+    driver = DialogDriver(FakeClient(), max_idle=10, clock=clock)
+
+    async def run():
+        await driver.handle('old', 'weather')
+        clock.now = 5
+        await driver.handle('new', 'weather')
+        clock.now = 12
+        return driver.expire_stale()
+
+    assert asyncio.run(run()) == ['old']
+    assert list(driver.conversations) == ['new']
+
+
+def test_Given_SlowClient_When_Handling_Then_TimeoutIsRaisedAndConversationDropped():
+    driver = DialogDriver(FakeClient(delay=0.2), timeout=0.01)
+
+    async def run():
+        await driver.handle('user', 'weather')
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert driver.conversations == {}
+    assert driver._sessions == {}
+
+
+def test_Given_FailingClient_When_Handling_Then_NoSessionIsLeft():
+    class FailingClient:
+        def analyze(self, text, conversation=None, deadline=None):
+            raise ValueError('Text cannot be empty')
+    driver = DialogDriver(FailingClient(), max_idle=None)
+
+    async def run():
+        for key in range(3):
+            with pytest.raises(ValueError):
+                await driver.handle(key, ' ')
+
+    asyncio.run(run())
+    assert driver._sessions == {}
+    assert driver.conversations == {}
+
+
+def test_Given_Timeout_When_Handling_Then_ItIsGivenToTheClientAsDeadline():
+    from luis_wrapper.LuisClient import Client, DeadlineExceeded
+    from luis_wrapper.LuisTransport import StubTransport
+    transport = StubTransport(lambda url: {}, delay=5)
+    driver = DialogDriver(Client('An app id', 'A subscription key', transport=transport), timeout=0.05)
+
+    async def run():
+        start = time.monotonic()
+        with pytest.raises((DeadlineExceeded, asyncio.TimeoutError)):
+            await driver.handle('user', 'weather')
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1
+    # The request itself is bounded, so the executor thread is freed instead of blocking on LUIS
+    assert transport.timeouts[0] <= 0.05
+    assert driver._sessions == {}
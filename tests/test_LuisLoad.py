@@ -0,0 +1,71 @@
+import pytest
+import json
+import os
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisTransport import StubTransport
+from luis_wrapper.LuisLoad import LatencyHistogram, LatencyStub, LoadGenerator, read_corpus, main
+
+
+def stub_client(stub):
+    return Client('An app id', 'A subscription key', transport=StubTransport(stub))
+
+
+class TestLatencyHistogram:
+
+    def test_Given_Values_When_AskingPercentiles_Then_TheyAreWithinPrecision(self):
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.record(ms / 1000)
+        for percent, expected in [(50, 0.5), (90, 0.9), (99, 0.99), (100, 1.0)]:
+            assert histogram.percentile(percent) == pytest.approx(expected, rel=0.01)
+        assert histogram.count == 1000
+        assert histogram.mean == pytest.approx(0.5005)
+
+    def test_Given_NoValues_When_AskingPercentiles_Then_ZeroIsReturned(self):
+        assert LatencyHistogram().percentile(99) == 0.0
+
+
+class TestLoadGenerator:
+
+    def test_Given_FastStub_When_Running_Then_AllItemsAreSentAtTargetRate(self):
+        generator = LoadGenerator(stub_client(LatencyStub()), ['hello', 'weather'], qps=200)
+        report = generator.run(40)
+        assert report['items'] == 40
+        assert report['error_rate'] == 0.0
+        assert report['achieved_qps'] == pytest.approx(200, rel=0.25)
+        assert report['latency_ms']['p50'] < 50
+
+    def test_Given_SaturatedClient_When_Running_Then_QueueingDelayIsIncludedInLatency(self):
+        generator = LoadGenerator(stub_client(LatencyStub(latency=lambda: 0.02)), ['hello'], qps=200, workers=1)
+        report = generator.run(10)
+        # A closed-loop measurement would only see the 20 ms service time
+        assert report['service_time_ms']['p50'] < 40
+        assert report['latency_ms']['max'] > 100
+
+    def test_Given_MultiTurnItems_When_Running_Then_RepliesAreSent(self):
+        generator = LoadGenerator(stub_client(LatencyStub(ask_questions=True)), [['weather', 'copenhagen']],
+                                  qps=100)
+        report = generator.run(5)
+        assert report['turns'] == 10
+        assert report['items'] == 5
+
+    def test_Given_FailingBackend_When_Running_Then_ErrorsAreCounted(self):
+        generator = LoadGenerator(stub_client(lambda url: 503), ['hello'], qps=100)
+        report = generator.run(4)
+        assert report['error_rate'] == 1.0
+        assert report['errors'] == {'TransportError': 4}
+
+    @pytest.mark.parametrize("corpus, qps", [([], 10), (['hello'], 0)])
+    def test_Given_InvalidArguments_When_Initializing_Then_ExceptionIsRaised(self, corpus, qps):
+        with pytest.raises(ValueError):
+            LoadGenerator(None, corpus, qps)
+
+
+def test_Given_CorpusFile_When_RunningScript_Then_ReportIsPrinted(tmpdir, capsys):
+    path = os.path.join(str(tmpdir), 'corpus.txt')
+    with open(path, 'w') as f:
+        f.write('hello\n\nweather || copenhagen\n')
+    assert read_corpus(path) == ['hello', ['weather', 'copenhagen']]
+    main([path, '--qps', '50', '--duration', '0.1', '--stub-latency-ms', '1'])
+    report = json.loads(capsys.readouterr().out)
+    assert report['items'] == 5
@@ -0,0 +1,118 @@
+import pytest
+import os
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisPreClassifier import PreClassifier, normalize
+from conftest import create_response
+
+
+@pytest.fixture
+def classifier():
+    classifier = PreClassifier()
+    classifier.add_utterance('Greeting', 'Hello there')
+    classifier.add_utterance('Cancel', 'cancel')
+    return classifier
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Hello there', 'hello there'),
+    ('Hello+there%21', 'hello there'),
+    ('  HELLO,   there!! ', 'hello there')
+])
+def test_Given_Text_When_Normalizing_Then_TrivialDifferencesAreRemoved(text, expected):
+    assert normalize(text) == expected
+
+
+class TestPreClassifier:
+
+    def test_Given_KnownUtterance_When_Classifying_Then_SyntheticResponseIsReturned(self, classifier):
+        response = classifier.classify('hello+there%21')
+        assert response.top_scoring_intent.name == 'Greeting'
+        assert response.query == 'hello there!'
+        assert response.entities == []
+        assert classifier.hits == 1
+
+    def test_Given_UnknownUtterance_When_Classifying_Then_NoneIsReturned(self, classifier):
+        assert classifier.classify('what is the weather') is None
+        assert classifier.misses == 1
+        assert classifier.hit_rate == 0.0
+
+    def test_Given_ConflictingAnswers_When_Classifying_Then_NoneIsReturned(self):
+        classifier = PreClassifier(min_agreement=0.8)
+        for intent_name in ['Greeting', 'Greeting', 'Greeting', 'None']:
+            classifier.add_response(create_response('hi', intent_name))
+        assert classifier.classify('hi') is None
+
+    def test_Given_TooFewAnswers_When_Classifying_Then_NoneIsReturned(self, classifier):
+        classifier.min_count = 2
+        assert classifier.classify('cancel') is None
+
+    def test_Given_RecordedEntity_When_Classifying_Then_OnlyTheExactQueryIsAnswered(self):
+        response = create_response('weather in copenhagen', 'GetWeather')
+        response.json['entities'] = [{'entity': 'copenhagen', 'type': 'Location', 'startIndex': 11,
+                                      'endIndex': 20, 'score': 0.9}]
+        classifier = PreClassifier()
+        classifier.add_response(Response(response.json))
+        assert classifier.classify('Weather,+in+++Copenhagen%21') is None
+        local = classifier.classify('weather+in+copenhagen')
+        entity = local.entities[0]
+        assert local.query[entity.start_index:entity.end_index + 1] == 'copenhagen'
+
+    def test_Given_LowConfidenceAnswer_When_Classifying_Then_NoneIsReturned(self):
+        classifier = PreClassifier()
+        classifier.add_response(create_response('hmm', 'None', score=0.2))
+        assert classifier.classify('hmm') is None
+        classifier.min_score = 0.1
+        assert classifier.classify('hmm').top_scoring_intent.name == 'None'
+
+    def test_Given_QueryWithoutWords_When_Indexing_Then_ItIsNeverAnswered(self):
+        classifier = PreClassifier()
+        classifier.add_response(create_response('?', 'Help'))
+        classifier.add_utterance('Help', '...')
+        assert len(classifier) == 0
+        assert classifier.classify('%21%21%21') is None
+
+    def test_Given_ResponseWithDialog_When_Adding_Then_ItIsIgnored(self):
+        classifier = PreClassifier()
+        classifier.add_response(create_response('weather', 'GetWeather', dialog={'contextId': 'id', 'status': 'Finished'}))
+        assert len(classifier) == 0
+
+    def test_Given_LabeledFile_When_Loading_Then_UtterancesAreIndexed(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'utterances.tsv')
+        with open(path, 'w') as f:
+            f.write('# intent\tutterance\nGreeting\thi\n\nHelp\thelp me\n')
+        classifier = PreClassifier()
+        classifier.load_utterances(path)
+        assert len(classifier) == 2
+        assert classifier.classify('Help me').top_scoring_intent.name == 'Help'
+
+    def test_Given_RecordedResponses_When_Evaluating_Then_HitRateAndAgreementAreReported(self, classifier):
+        responses = [create_response('hello there', 'Greeting'), create_response('cancel', 'Stop'),
+                     create_response('weather', 'GetWeather')]
+        result = classifier.evaluate(responses)
+        assert result == {'total': 3, 'hits': 2, 'agreements': 1, 'hit_rate': 2 / 3, 'agreement': 0.5}
+        assert classifier.hits == 0
+
+
+class TestClient:
+
+    def test_Given_KnownUtterance_When_Analyzing_Then_LuisIsNotCalled(self, classifier, monkeypatch):
+        def fail(*args, **kwargs):
+            raise AssertionError('LUIS should not be called')
+        monkeypatch.setattr('requests.get', fail)
+        client = Client('An app id', 'A subscription key', pre_classifier=classifier)
+        conversation = client.analyze('Hello there')
+        assert conversation.last_response.top_scoring_intent.name == 'Greeting'
+        assert conversation.conversation_is_finished()
+
+    def test_Given_UnknownUtterance_When_Analyzing_Then_LuisIsCalled(self, classifier, monkeypatch):
+        class FakeRequestsResponse:
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return create_response('weather', 'GetWeather').json
+        monkeypatch.setattr('requests.get', lambda *_, **__: FakeRequestsResponse())
+        client = Client('An app id', 'A subscription key', pre_classifier=classifier)
+        conversation = client.analyze('weather')
+        assert conversation.last_response.top_scoring_intent.name == 'GetWeather'
@@ -3,6 +3,7 @@ import os
 from distutils import dir_util
 from luis_wrapper.LuisResponse import *
 import json
+import datetime
 
 @pytest.fixture
 def datadir(tmpdir, request):
@@ -100,3 +101,60 @@ class TestDialog:
         dialog = Dialog(dict_)
         for attr in ['prompt', 'name', 'parameter_type']:
             assert dialog.__getattribute__(attr) is None
+
+
+class TestTypedResolution:
+
+    @pytest.mark.parametrize("value, expected_parts", [
+        ('XXXX-WXX-1', {'weekday': 1}),
+        ('2016-12-24', {'year': 2016, 'month': 12, 'day': 24}),
+        ('XXXX-12-24T09:30', {'month': 12, 'day': 24, 'hour': 9, 'minute': 30}),
+        ('2016-W50', {'year': 2016, 'week': 50}),
+        ('T09', {'hour': 9}),
+        ('PT2H', {'duration': datetime.timedelta(hours=2)}),
+        ('P1Y', {'duration': datetime.timedelta(0), 'duration_years': 1}),
+        ('P3M', {'duration': datetime.timedelta(0), 'duration_months': 3}),
+        ('P1Y6M2DT1H', {'duration': datetime.timedelta(days=2, hours=1), 'duration_years': 1, 'duration_months': 6}),
+        ('T24', {}),
+        ('2016-13-24T09:75', {'year': 2016, 'day': 24, 'hour': 9}),
+        ('PRESENT_REF', {})
+    ])
+    def test_Given_TimexExpression_When_Parsing_Then_KnownPartsAreSet(self, value, expected_parts):
+        timex = parse_timex(value)
+        for field in Timex._fields[1:]:
+            assert getattr(timex, field) == expected_parts.get(field)
+
+    def test_Given_CompleteDate_When_Parsing_Then_DateAndTimeAreAvailable(self):
+        timex = parse_timex('2016-12-24T09:30')
+        assert timex.date == datetime.date(2016, 12, 24)
+        assert timex.time == datetime.time(9, 30)
+        assert parse_timex('XXXX-WXX-1').date is None
+        assert parse_timex('2016-02-30').date is None
+
+    def test_Given_OutOfRangeHour_When_Parsing_Then_TimeIsNone(self):
+        timex = parse_timex('T24')
+        assert timex.hour is None
+        assert timex.time is None
+
+    def test_Given_RepeatedExpression_When_Parsing_Then_CachedValueIsReturned(self):
+        assert parse_timex('XXXX-WXX-3') is parse_timex('XXXX-WXX-3')
+
+    @pytest.mark.parametrize("type_, resolution, expected", [
+        ('builtin.datetime.date', {'date': 'XXXX-WXX-1'}, DateTimeResolution('date', parse_timex('XXXX-WXX-1'), None)),
+        ('builtin.datetime.time', {'time': 'T09', 'comment': 'ampm'},
+         DateTimeResolution('time', parse_timex('T09'), 'ampm')),
+        ('builtin.number', {'value': '1,000'}, NumberResolution(1000, None)),
+        ('builtin.money', {'value': '2.5', 'unit': 'Dollar'}, NumberResolution(2.5, 'Dollar')),
+        ('builtin.number', {'value': 'many'}, None),
+        ('Location', {}, None),
+        ('Location', None, None)
+    ])
+    def test_Given_Resolution_When_Decoding_Then_TypedResolutionIsReturned(self, type_, resolution, expected):
+        assert decode_resolution(type_, resolution) == expected
+
+    def test_Given_Entity_When_AccessingTypedResolution_Then_ItIsDecodedOnce(self, monkeypatch):
+        entity = BaseEntity({'entity': 'monday', 'type': 'builtin.datetime.date', 'resolution': {'date': 'XXXX-WXX-1'}})
+        first = entity.typed_resolution
+        monkeypatch.setattr('luis_wrapper.LuisResponse.decode_resolution', None)
+        assert entity.typed_resolution is first
+        assert first.timex.weekday == 1
@@ -0,0 +1,115 @@
+import pytest
+import os
+import json
+import marshal
+import pickle
+import random
+import struct
+import timeit
+import zlib
+from luis_wrapper.LuisResponse import Response
+from luis_wrapper.LuisSerializer import dumps, loads, SerializationError
+
+
+@pytest.fixture
+def response_dict():
+    path = os.path.join(os.path.dirname(__file__), 'test_LuisResponse', 'Response.json')
+    with open(path, 'r') as f:
+        return json.load(f)['NoMissingParameters']
+
+
+@pytest.fixture
+def question_dict(response_dict):
+    path = os.path.join(os.path.dirname(__file__), 'test_LuisResponse', 'Dialog.json')
+    with open(path, 'r') as f:
+        response_dict['dialog'] = json.load(f)['NoMissingParameters']
+    return response_dict
+
+
+class TestResponse:
+
+    def test_Given_Response_When_RoundTripping_Then_JsonIsUnchanged(self, response_dict):
+        response = loads(dumps(Response(response_dict)))
+        assert isinstance(response, Response)
+        assert response.json == response_dict
+        assert response.top_scoring_intent.name == 'GetWeather'
+        assert response.entities[0].start_index == 23
+
+    @pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+    def test_Given_AnyBufferType_When_Loading_Then_ResponseIsReturned(self, response_dict, wrap):
+        data = wrap(dumps(Response(response_dict)))
+        assert loads(data).json == response_dict
+
+    def test_Given_Response_When_Serializing_Then_ResultIsSmallerThanJsonAndPickle(self, response_dict):
+        response = Response(response_dict)
+        data = dumps(response)
+        assert len(data) < len(json.dumps(response_dict).encode('utf-8'))
+        assert len(data) < len(pickle.dumps(response))
+
+    def test_Given_Response_When_LoadingAndDumping_Then_ItIsFasterThanPickle(self, response_dict):
+        response = Response(response_dict)
+        data, pickled = dumps(response), pickle.dumps(response)
+
+        def best(function):
+            return min(timeit.repeat(function, number=500, repeat=5))
+        assert best(lambda: loads(data)) < best(lambda: pickle.loads(pickled))
+        assert best(lambda: dumps(response)) < best(lambda: pickle.dumps(response))
+
+    def test_Given_RepeatedStrings_When_Loading_Then_StringsAreShared(self, response_dict):
+        response = loads(dumps(Response(response_dict)))
+        assert response.intents[0].name is response.top_scoring_intent.name
+
+
+class TestConversation:
+
+    def test_Given_Conversation_When_RoundTripping_Then_ResponsesAndIdAreKept(self, question_dict, response_dict):
+        from luis_wrapper.LuisClient import Conversation
+        conversation = Conversation(Response(question_dict))
+        conversation.add_response(Response(dict(response_dict, dialog=question_dict['dialog'])))
+        result = loads(dumps(conversation))
+        assert isinstance(result, Conversation)
+        assert result.id == conversation.id
+        assert [r.json for r in result.responses] == [r.json for r in conversation.responses]
+
+
+class TestParts:
+
+    def test_Given_Parts_When_RoundTripping_Then_JsonIsUnchanged(self, question_dict):
+        response = Response(question_dict)
+        for part in [response.top_scoring_intent, response.entities[0], response.dialog]:
+            result = loads(dumps(part))
+            assert type(result) is type(part)
+            assert result.json == part.json
+        assert loads(dumps(response.entities[0])).start_index == 23
+        assert loads(dumps(response.dialog)).context_id == response.dialog.context_id
+
+
+def frame(kind, body, version=2):
+    """Data with a valid header and checksum around a marshalled body"""
+    body = marshal.dumps(body)
+    return struct.pack('<4sBBI', b'LUIS', version, kind, zlib.crc32(body)) + body
+
+
+@pytest.mark.parametrize("data", [
+    b'', b'LUIS\x02\x00', b'XXXX\x02\x00\x00\x00\x00\x00', frame(0, {}, version=99), frame(9, {}),
+    frame(0, {})[:-1], frame(0, []), frame(0, {'query': 'hello'}), frame(1, []), frame(1, {}), frame(2, {'score': 1}),
+    b'LUIS\x01\x00' + b'\0' * 4 + b'\0' + b'\0' * 4
+])
+def test_Given_InvalidData_When_Loading_Then_ExceptionIsRaised(data):
+    with pytest.raises(SerializationError):
+        loads(data)
+
+
+def test_Given_CorruptedBytes_When_Loading_Then_OnlySerializationErrorIsRaised(response_dict):
+    data = dumps(Response(response_dict))
+    rand = random.Random(0)
+    for _ in range(5000):
+        corrupt = bytearray(data)
+        corrupt[rand.randrange(len(corrupt))] ^= rand.randrange(1, 256)
+        with pytest.raises(SerializationError):
+            loads(bytes(corrupt))
+
+
+def test_Given_UnsupportedObject_When_Dumping_Then_ExceptionIsRaised():
+    with pytest.raises(SerializationError):
+        dumps(object())
@@ -0,0 +1,120 @@
+import pytest
+import threading
+import time
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisTransport import StubTransport
+from luis_wrapper.LuisShadow import ShadowTraffic
+from luis_wrapper.LuisPreClassifier import PreClassifier
+from conftest import create_json
+
+
+def live_client(shadow):
+    return Client('live app', 'A subscription key', shadow=shadow,
+                  transport=StubTransport(lambda url: create_json('q', 'GetWeather', ['copenhagen'])))
+
+
+def test_Given_SampledQueries_When_Closing_Then_AgreementIsRecorded():
+    answers = iter([create_json('q', 'GetWeather', ['copenhagen']), create_json('q', 'GetWeather'),
+                    create_json('q', 'None', ['copenhagen'])])
+    candidate = Client('candidate app', 'A subscription key', transport=StubTransport(lambda url: next(answers)))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0)
+    client = live_client(shadow)
+    for _ in range(3):
+        client.analyze('copenhagen')
+    shadow.close()
+    assert shadow.stats() == {'sampled': 3, 'dropped': 0, 'compared': 3, 'errors': 0,
+                              'intent_agreement': 2 / 3, 'entity_agreement': 2 / 3}
+    assert all('candidate app' in url for url in candidate.transport.urls)
+
+
+def test_Given_SampleRate_When_Submitting_Then_OnlySampledQueriesAreMirrored():
+    numbers = iter([0.05, 0.5, 0.09, 0.1])
+    candidate = Client('candidate app', 'A subscription key',
+                       transport=StubTransport(lambda url: create_json('q', 'GetWeather')))
+    shadow = ShadowTraffic(candidate, sample_rate=0.1, random_=lambda: next(numbers))
+    client = live_client(shadow)
+    for _ in range(4):
+        client.analyze('copenhagen')
+    shadow.close()
+    assert shadow.sampled == 2
+    assert len(candidate.transport.urls) == 2
+
+
+def test_Given_BlockedCandidate_When_QueueIsFull_Then_QueriesAreDropped():
+    release = threading.Event()
+
+    def blocked(url):
+        release.wait(5)
+        return create_json('q', 'GetWeather')
+    candidate = Client('candidate app', 'A subscription key', transport=StubTransport(blocked))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0, queue_size=2)
+    client = live_client(shadow)
+    for _ in range(10):
+        client.analyze('copenhagen')
+    release.set()
+    shadow.close()
+    stats = shadow.stats()
+    assert stats['dropped'] >= 10 - 2 - 1
+    assert stats['compared'] + stats['dropped'] == 10
+
+
+def test_Given_HungCandidateAndFullQueue_When_Closing_Then_CloseReturnsWithinTimeout():
+    release = threading.Event()
+
+    def hung(url):
+        release.wait(5)
+        return create_json('q', 'GetWeather')
+    candidate = Client('candidate app', 'A subscription key', transport=StubTransport(hung))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0, queue_size=2)
+    client = live_client(shadow)
+    for _ in range(5):
+        client.analyze('copenhagen')
+    start = time.monotonic()
+    shadow.close(timeout=0.1)
+    assert time.monotonic() - start < 1
+    release.set()
+
+
+def test_Given_SlowCandidate_When_Mirroring_Then_DeadlineStopsTheRequest():
+    candidate = Client('candidate app', 'A subscription key',
+                       transport=StubTransport(lambda url: create_json('q', 'GetWeather'), delay=5))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0, deadline=0.05)
+    live_client(shadow).analyze('copenhagen')
+    shadow.close(timeout=2)
+    assert (shadow.errors, shadow.compared) == (1, 0)
+    assert candidate.transport.timeouts[0] <= 0.05
+
+
+def test_Given_QueryAnsweredByPreClassifier_When_Asking_Then_QueryIsStillMirrored():
+    candidate = Client('candidate app', 'A subscription key',
+                       transport=StubTransport(lambda url: create_json('q', 'Greeting')))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0)
+    pre_classifier = PreClassifier()
+    pre_classifier.add_utterance('Greeting', 'hello')
+    client = Client('live app', 'A subscription key', shadow=shadow, pre_classifier=pre_classifier,
+                    transport=StubTransport(lambda url: create_json('q', 'Greeting')))
+    client.analyze('hello')
+    shadow.close()
+    assert client.transport.urls == []
+    assert (shadow.sampled, shadow.compared, shadow.intent_agreements) == (1, 1, 1)
+
+
+@pytest.mark.parametrize("deadline, default_deadline, expected", [
+    (None, None, 10.0), (None, 2.0, 2.0), (0.5, 2.0, 0.5)
+])
+def test_Given_Deadlines_When_Initializing_Then_ExplicitDeadlineWins(deadline, default_deadline, expected):
+    candidate = Client('candidate app', 'A subscription key', default_deadline=default_deadline)
+    assert ShadowTraffic(candidate, deadline=deadline).deadline == expected
+
+
+def test_Given_FailingCandidate_When_Mirroring_Then_ErrorIsCounted():
+    candidate = Client('candidate app', 'A subscription key', transport=StubTransport(lambda url: 503))
+    shadow = ShadowTraffic(candidate, sample_rate=1.0)
+    live_client(shadow).analyze('copenhagen')
+    shadow.close()
+    assert (shadow.errors, shadow.compared) == (1, 0)
+
+
+def test_Given_InvalidSampleRate_When_Initializing_Then_ExceptionIsRaised():
+    with pytest.raises(ValueError):
+        ShadowTraffic(None, sample_rate=1.5)
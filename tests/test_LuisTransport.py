@@ -0,0 +1,130 @@
+import pytest
+import gzip
+import http.server
+import json
+import sys
+import threading
+import requests
+from luis_wrapper.LuisClient import Client
+from luis_wrapper.LuisTransport import RequestsTransport, Http2Transport, StubTransport, TransportError
+from conftest import BODY
+
+
+class GzipHandler(http.server.BaseHTTPRequestHandler):
+    """Returns BODY, compressed if the client accepts gzip. Paths starting with /status/ return that status."""
+    accept_encodings = []
+
+    def do_GET(self):
+        if self.path.startswith('/status/'):
+            self.send_error(int(self.path.split('/')[-1]))
+            return
+        accept_encoding = self.headers.get('Accept-Encoding', '')
+        self.accept_encodings.append(accept_encoding)
+        body = json.dumps(BODY).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in accept_encoding:
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = http.server.HTTPServer(('127.0.0.1', 0), GzipHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    GzipHandler.accept_encodings = []
+    yield 'http://127.0.0.1:{}/'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+class TestRequestsTransport:
+
+    @pytest.mark.parametrize("session", [None, requests.Session()])
+    def test_Given_LocalServer_When_Getting_Then_CompressedBodyIsNegotiatedAndDecoded(self, server_url, session):
+        transport = RequestsTransport(session)
+        assert transport.get(server_url) == BODY
+        assert 'gzip' in GzipHandler.accept_encodings[0]
+        assert 'deflate' in GzipHandler.accept_encodings[0]
+        transport.close()
+
+    @pytest.mark.parametrize("status_code", [404, 429, 503])
+    def test_Given_ErrorStatus_When_Getting_Then_TransportErrorIsRaised(self, server_url, status_code):
+        with pytest.raises(TransportError) as err:
+            RequestsTransport().get('{}status/{}'.format(server_url, status_code))
+        assert err.value.status_code == status_code
+
+    def test_Given_RequestsTimeout_When_Getting_Then_TimeoutErrorIsRaised(self, monkeypatch):
+        def timeout(*args, **kwargs):
+            assert kwargs['timeout'] == 0.5
+            raise requests.Timeout('Read timed out')
+        monkeypatch.setattr('requests.get', timeout)
+        with pytest.raises(TimeoutError):
+            RequestsTransport().get('url', timeout=0.5)
+
+
+    @pytest.mark.parametrize("timeout", [0, 0.0, -1])
+    def test_Given_NoTimeLeft_When_Getting_Then_TimeoutErrorIsRaisedWithoutSending(self, monkeypatch, timeout):
+        def get(*args, **kwargs):
+            raise AssertionError('The request should not be sent')
+        monkeypatch.setattr('requests.get', get)
+        with pytest.raises(TimeoutError):
+            RequestsTransport().get('url', timeout=timeout)
+
+
+class TestStubTransport:
+
+    def test_Given_Dict_When_Getting_Then_BodyIsReturnedAndUrlRecorded(self):
+        transport = StubTransport({'url': BODY})
+        assert transport.get('url') == BODY
+        assert transport.urls == ['url']
+
+    def test_Given_JsonString_When_Getting_Then_BodyIsDecoded(self):
+        transport = StubTransport(lambda url: json.dumps(BODY))
+        assert transport.get('url') == BODY
+
+    @pytest.mark.parametrize("responses, status_code", [
+        ({}, 404), ({'url': 429}, 429), (lambda url: 503, 503)
+    ])
+    def test_Given_ErrorStatus_When_Getting_Then_TransportErrorIsRaised(self, responses, status_code):
+        with pytest.raises(TransportError) as err:
+            StubTransport(responses).get('url')
+        assert err.value.status_code == status_code
+
+
+def test_Given_StubTransport_When_Analyzing_Then_TransportIsUsed():
+    transport = StubTransport(lambda url: BODY)
+    client = Client('An app id', 'A subscription key', transport=transport)
+    conversation = client.analyze('hello')
+    assert conversation.last_response.top_scoring_intent.name == 'Greeting'
+    assert transport.urls == [client._build_base_url('hello')]
+
+
+class TestHttp2Transport:
+
+    def test_Given_LocalServer_When_Getting_Then_CompressedBodyIsNegotiatedAndDecoded(self, server_url):
+        pytest.importorskip('httpx')
+        pytest.importorskip('h2')
+        transport = Http2Transport()
+        try:
+            assert transport.get(server_url, timeout=5) == BODY
+            assert 'gzip' in GzipHandler.accept_encodings[0]
+            with pytest.raises(TransportError) as err:
+                transport.get('{}status/429'.format(server_url), timeout=5)
+            assert err.value.status_code == 429
+        finally:
+            transport.close()
+
+
+def test_Given_HttpxIsMissing_When_CreatingHttp2Transport_Then_ImportErrorIsRaised(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'httpx', None)
+    with pytest.raises(ImportError) as err:
+        Http2Transport()
+    assert 'httpx' in str(err.value)